@@ -2,14 +2,34 @@ from shared.environment import ensure_environment_initialized
 
 ensure_environment_initialized()
 
+import uuid
+
 import streamlit as st
 from shared import logging
+from shared.genai import get_service
 
 import utils.streamlit.streamlit_launcher as sl
+from utils.genai.cancellation import RequestCancelled
+from utils.genai.conversation import ConversationStore
+from utils.streamlit import memo
 
 
 logger = logging.get_app_logger()
 
+REQUEST_TIMEOUT = 120
+
+
+@st.cache_resource
+def get_conversations():
+    # Conversations are kept per session id, shared across reruns
+    return ConversationStore(get_service(), max_tokens=3000, keep_recent=4)
+
+
+@memo.memoize(ttl=300)
+def list_models():
+    # Shared by all sessions; failed lookups raise and are not cached
+    return get_service().get_active_model_names()
+
 
 def streamlit_main():
     logger.info("Running main()")
@@ -21,6 +41,70 @@ def streamlit_main():
 
     st.markdown("### Language Model Playground :hammer_and_wrench:")
 
+    service = get_service()
+    conversations = get_conversations()
+
+    with st.sidebar:
+        try:
+            models = list_models()
+        except Exception as e:
+            logger.error(f"Could not list models: {e}")
+            models = []
+        default_model = service.get_default_model()
+        if models:
+            index = models.index(default_model) if default_model in models else 0
+            model = st.selectbox("Model", models, index=index)
+        else:
+            model = st.text_input("Model", value=default_model)
+        temperature = st.slider("Temperature", 0.0, 2.0, 0.0, 0.1)
+        context = st.text_area("System context", height=150)
+        if st.button("New conversation"):
+            conversations.drop(st.session_state.pop("conversation_id", ""))
+            st.session_state.pop("transcript", None)
+
+    if "conversation_id" not in st.session_state:
+        st.session_state["conversation_id"] = uuid.uuid4().hex
+    conversation = conversations.get(st.session_state["conversation_id"])
+    conversation.context = context or None
+
+    # The conversation folds older turns into a summary to bound the prompt,
+    # so the full transcript shown to the user is kept separately
+    transcript = st.session_state.setdefault("transcript", [])
+    for role, content in transcript:
+        with st.chat_message(role):
+            st.markdown(content)
+
+    if prompt := st.chat_input("Say something"):
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        with st.chat_message("assistant"):
+            # Cancelled on rerun or when the session ends, so abandoned
+            # answers stop streaming and release their connection
+            try:
+                reply = st.write_stream(
+                    conversation.stream(
+                        prompt,
+                        model=model,
+                        temperature=temperature,
+                        timeout=REQUEST_TIMEOUT,
+                        cancel_token=sl.run_cancel_token(),
+                    )
+                )
+                # Like the conversation, only completed exchanges are kept
+                transcript.append(("user", prompt))
+                transcript.append(("assistant", reply))
+            except RequestCancelled as e:
+                st.warning(f"Request cancelled: {e}")
+            except Exception as e:
+                logger.error(f"Chat request failed: {e}")
+                st.error(f"{e}")
+
+    if conversation.summary:
+        with st.sidebar.expander("Conversation summary"):
+            st.markdown(conversation.summary)
+    st.sidebar.caption(f"~{conversation.history_tokens()} history tokens")
+
 
 def initializer():
     logger.info("Running initializer()")
@@ -0,0 +1,404 @@
+"""
+Streaming upload ingestion for Noteworthy.
+
+Uploads are copied to disk in fixed-size blocks while their SHA-256 is
+computed, then text is extracted with generators and cut into chunks sized
+for LLM prompts. Each chunk becomes a note, indexed for search. Chunks are
+stored with the "imported" event, so the background job scheduler does not
+queue LLM jobs for every chunk of an upload. Peak memory depends on the
+block and chunk sizes, never on the upload size.
+
+Deduplication happens at two levels: an upload whose content hash was
+already ingested is discarded right after spooling, and chunks seen before
+(in any upload) are not stored again. Chunk boundaries are content defined,
+so an edited re-upload only produces new chunks around the edits.
+"""
+from __future__ import annotations
+
+import codecs
+import hashlib
+import itertools
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from .store import NotesStore
+
+try:
+    import pypdf
+except ImportError:  # Optional dependency, only needed for PDF uploads
+    pypdf = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_UPLOAD_DIR = os.path.join("data", "uploads")
+BLOCK_SIZE = 1024 * 1024
+TEXT_EXTENSIONS = {".txt", ".md", ".markdown", ".csv", ".json", ".log", ".rst", ".html", ".xml"}
+
+# Chunk sizes in characters; about 1000 tokens for a full chunk
+MIN_CHUNK_CHARS = 1000
+MAX_CHUNK_CHARS = 4000
+# A line ends a chunk (once past the minimum) when its hash is divisible by this
+BOUNDARY_DIVISOR = 8
+# Chunks written per transaction
+CHUNK_BATCH_SIZE = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    content_hash TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    chunks INTEGER NOT NULL,
+    created REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS upload_chunks (
+    chunk_hash TEXT PRIMARY KEY,
+    note_id INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class SpooledUpload:
+    """An upload copied to disk, with its content hash."""
+
+    def __init__(self, name: str, path: str, size: int, content_hash: str):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.content_hash = content_hash
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __repr__(self) -> str:
+        return f"SpooledUpload(name={self.name!r}, size={self.size}, hash={self.content_hash[:12]})"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+class IngestResult:
+    """Outcome of ingesting one upload."""
+
+    def __init__(
+        self,
+        name: str,
+        content_hash: str,
+        chunks: int,
+        new_chunks: int,
+        duplicate: bool,
+        skipped: Optional[List[str]] = None,
+    ):
+        self.name = name
+        self.content_hash = content_hash
+        self.chunks = chunks
+        self.new_chunks = new_chunks
+        self.duplicate = duplicate
+        # Files whose text could not be extracted, e.g. unsupported zip members
+        self.skipped = skipped or []
+
+    def __repr__(self) -> str:
+        return (
+            f"IngestResult(name={self.name!r}, chunks={self.chunks}, "
+            f"new_chunks={self.new_chunks}, duplicate={self.duplicate}, skipped={len(self.skipped)})"
+        )
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+class _HashingWriter:
+    # Writes blocks to a temporary file in `directory`, hashing them on the way
+    def __init__(self, name: str, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.name = name
+        self.size = 0
+        self._hash = hashlib.sha256()
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes) -> None:
+        self._hash.update(data)
+        self._file.write(data)
+        self.size += len(data)
+
+    def close(self) -> SpooledUpload:
+        self._file.close()
+        return SpooledUpload(self.name, self.path, self.size, self._hash.hexdigest())
+
+
+def spool(
+    stream: BinaryIO, name: str, directory: str = DEFAULT_UPLOAD_DIR, block_size: int = BLOCK_SIZE
+) -> SpooledUpload:
+    """
+    Copy a binary stream to a temporary file, one block at a time.
+
+    Args:
+        stream: Readable binary stream, e.g. a Streamlit UploadedFile
+        name: Original file name
+        directory: Directory for the spooled file
+        block_size: Bytes read and written at a time
+
+    Returns:
+        The spooled upload
+    """
+    writer = _HashingWriter(name, directory)
+    try:
+        while True:
+            block = stream.read(block_size)
+            if not block:
+                break
+            writer.write(block)
+    except Exception:
+        writer.close().remove()
+        raise
+    return writer.close()
+
+
+def extract_text(
+    stream: BinaryIO,
+    name: str,
+    block_size: int = BLOCK_SIZE,
+    skipped: Optional[List[str]] = None,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Extract text from a file incrementally.
+
+    Plain text is decoded block by block, PDFs page by page and zip archives
+    member by member, recursively. Unsupported files yield nothing.
+
+    Args:
+        stream: Seekable binary stream
+        name: File name, used to pick the format
+        block_size: Bytes decoded at a time for text files
+        skipped: Optional list the names of files that cannot be read are appended to
+
+    Yields:
+        (source name, text) pairs; a zip member's source is "archive.zip/member"
+    """
+    extension = os.path.splitext(name)[1].lower()
+
+    if extension == ".pdf":
+        if pypdf is None:
+            logger.warning(f"Skipping {name}: pypdf is required for PDF uploads")
+            if skipped is not None:
+                skipped.append(name)
+            return
+        for page in pypdf.PdfReader(stream).pages:
+            yield name, (page.extract_text() or "") + "\n"
+
+    elif extension == ".zip" or (extension not in TEXT_EXTENSIONS and _is_zip(stream)):
+        with zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                with archive.open(info) as member:
+                    member_skipped: List[str] = []
+                    for source, text in extract_text(member, info.filename, block_size, member_skipped):
+                        yield f"{name}/{source}", text
+                    if skipped is not None:
+                        skipped.extend(f"{name}/{source}" for source in member_skipped)
+
+    elif extension in TEXT_EXTENSIONS or not extension:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while True:
+            block = stream.read(block_size)
+            if not block:
+                break
+            yield name, decoder.decode(block)
+        yield name, decoder.decode(b"", final=True)
+
+    else:
+        logger.warning(f"Skipping {name}: unsupported file type")
+        if skipped is not None:
+            skipped.append(name)
+
+
+def _is_zip(stream: BinaryIO) -> bool:
+    # Archives are recognized by content too, e.g. .docx or files without an extension
+    try:
+        return zipfile.is_zipfile(stream)
+    finally:
+        stream.seek(0)
+
+
+def chunk_text(
+    pieces: Iterator[str],
+    min_chars: int = MIN_CHUNK_CHARS,
+    max_chars: int = MAX_CHUNK_CHARS,
+) -> Iterator[str]:
+    """
+    Cut a stream of text into chunks of at most `max_chars` characters.
+
+    Boundaries are content defined: past `min_chars`, a chunk ends after a
+    line whose hash is divisible by BOUNDARY_DIVISOR. Since a boundary only
+    depends on the line before it, inserting text shifts the boundaries
+    near the insertion and leaves the other chunks identical.
+
+    Args:
+        pieces: Text in arbitrary pieces, e.g. from extract_text
+        min_chars: Minimum chunk length, except for the last chunk
+        max_chars: Maximum chunk length; longer lines are split
+
+    Yields:
+        Chunks, whitespace-stripped and non-empty
+    """
+    lines: List[str] = []
+    size = 0
+
+    def flush():
+        nonlocal size
+        chunk = "".join(lines).strip()
+        lines.clear()
+        size = 0
+        if chunk:
+            yield chunk
+
+    def add(text):
+        # Append text, cutting it at max_chars, and yield the chunks it completes
+        nonlocal size
+        for start in range(0, len(text), max_chars):
+            line = text[start : start + max_chars]
+            if size + len(line) > max_chars and lines:
+                yield from flush()
+            lines.append(line)
+            size += len(line)
+            if size >= min_chars and zlib.crc32(line.encode("utf-8")) % BOUNDARY_DIVISOR == 0:
+                yield from flush()
+
+    pending = ""
+    for piece in pieces:
+        pending += piece
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            yield from add(line + "\n")
+        # A single line longer than a chunk is cut without waiting for its end
+        cut = (len(pending) - 1) // max_chars * max_chars
+        if cut > 0:
+            yield from add(pending[:cut])
+            pending = pending[cut:]
+
+    yield from add(pending)
+    yield from flush()
+
+
+class Ingestor:
+    """
+    Turns uploads into deduplicated, LLM-sized notes.
+    """
+
+    def __init__(self, store: NotesStore, directory: Optional[str] = None):
+        """
+        Initialize the ingestor.
+
+        Args:
+            store: Notes store the chunks are written to
+            directory: Spool directory, defaulting to the NOTES_UPLOAD_DIR
+                environment variable and then to data/uploads
+        """
+        self.store = store
+        self.directory = directory or os.environ.get("NOTES_UPLOAD_DIR", DEFAULT_UPLOAD_DIR)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(store.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def ingest(self, stream: BinaryIO, name: str) -> IngestResult:
+        """
+        Spool, extract, chunk and store one upload.
+
+        Args:
+            stream: Readable binary stream
+            name: Original file name
+
+        Returns:
+            The ingestion result
+        """
+        upload = spool(stream, name, self.directory)
+        try:
+            return self.ingest_spooled(upload)
+        finally:
+            upload.remove()
+
+    def ingest_spooled(self, upload: SpooledUpload) -> IngestResult:
+        """Extract, chunk and store an upload already spooled to disk."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chunks FROM uploads WHERE content_hash = ?", (upload.content_hash,)
+            ).fetchone()
+        if row:
+            logger.info(f"Skipping {upload.name}: already ingested")
+            return IngestResult(upload.name, upload.content_hash, row[0], 0, duplicate=True)
+
+        chunks = new_chunks = 0
+        batch: List[Tuple[str, str, str]] = []
+        skipped: List[str] = []
+        with open(upload.path, "rb") as f:
+            # Chunks never span files, so each zip member is chunked on its own
+            extracted = extract_text(f, upload.name, skipped=skipped)
+            for source, group in itertools.groupby(extracted, key=lambda item: item[0]):
+                pieces = (text for _, text in group)
+                for part, text in enumerate(chunk_text(pieces), start=1):
+                    chunks += 1
+                    chunk_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+                    batch.append((chunk_hash, f"{source} #{part}", text))
+                    if len(batch) >= CHUNK_BATCH_SIZE:
+                        new_chunks += self._add_chunks(batch)
+                        batch = []
+        new_chunks += self._add_chunks(batch)
+
+        # An upload with skipped files is not recorded, so it can be imported
+        # again once its formats are supported
+        if not skipped:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO uploads (content_hash, name, size, chunks, created) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (upload.content_hash, upload.name, upload.size, chunks, time.time()),
+                )
+
+        logger.info(f"Ingested {upload.name}: {chunks} chunks, {new_chunks} new, {len(skipped)} files skipped")
+        return IngestResult(
+            upload.name, upload.content_hash, chunks, new_chunks, duplicate=False, skipped=skipped
+        )
+
+    def _add_chunks(self, batch: List[Tuple[str, str, str]]) -> int:
+        # Store the (hash, title, text) chunks not seen before, as notes
+        with self._lock:
+            new = {}
+            for chunk_hash, title, text in batch:
+                if chunk_hash in new:
+                    continue
+                row = self._conn.execute(
+                    "SELECT note_id FROM upload_chunks WHERE chunk_hash = ?", (chunk_hash,)
+                ).fetchone()
+                # A chunk whose note was deleted is stored again
+                if row is None or self.store.get(row[0]) is None:
+                    new[chunk_hash] = (title, text)
+            if not new:
+                return 0
+
+            notes = self.store.create_many(list(new.values()), event="imported")
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO upload_chunks (chunk_hash, note_id) VALUES (?, ?)",
+                    [(chunk_hash, note.id) for chunk_hash, note in zip(new, notes)],
+                )
+        return len(notes)
+
+    def __repr__(self) -> str:
+        return f"Ingestor(path={self.store.path}, directory={self.directory})"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
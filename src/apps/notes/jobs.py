@@ -0,0 +1,419 @@
+"""
+Background jobs that precompute LLM results (summaries, tags, embeddings)
+for notes, backed by a persistent SQLite queue.
+
+Saving a note enqueues one job per kind. Imported notes are not queued on
+creation, since an upload can produce thousands of them; their jobs are
+queued when they are opened instead (enqueue_missing). Jobs are
+deduplicated by content hash: a note whose content already has a result
+(for any note) gets it copied without calling the provider, and re-saving
+unchanged content does nothing. Workers run in-process with bounded
+concurrency and retry failures with exponential backoff; a job that fails
+max_attempts times is not retried until the note's content changes.
+Results are written back so pages read them with a primary key lookup
+instead of waiting on the provider.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from utils.genai.cancellation import CancellationToken
+from utils.genai.genai_service import GenAIService
+
+from .store import NotesStore
+
+logger = logging.getLogger(__name__)
+
+# A handler computes one kind of result for a note's text and returns it as a string
+JobHandler = Callable[[GenAIService, str, CancellationToken], str]
+
+REQUEST_TIMEOUT = 120
+MAX_INPUT_CHARS = 24000
+
+SUMMARY_PROMPT = "Summarize the following note in two or three sentences."
+TAGS_SCHEMA = {
+    "type": "object",
+    "properties": {"tags": {"type": "array", "items": {"type": "string"}, "maxItems": 8}},
+    "required": ["tags"],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    note_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_run REAL NOT NULL,
+    last_error TEXT,
+    UNIQUE (note_id, kind)
+);
+
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority, next_run);
+
+CREATE TABLE IF NOT EXISTS job_results (
+    content_hash TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS note_results (
+    note_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    PRIMARY KEY (note_id, kind)
+) WITHOUT ROWID;
+"""
+
+
+def summarize(service: GenAIService, text: str, cancel_token: CancellationToken) -> str:
+    response = service.process_single_prompt(
+        text[:MAX_INPUT_CHARS], SUMMARY_PROMPT,
+        timeout=REQUEST_TIMEOUT, cancel_token=cancel_token,
+    )
+    if response.failure():
+        raise RuntimeError(response.unwrap())
+    return response.unwrap()
+
+
+def extract_tags(service: GenAIService, text: str, cancel_token: CancellationToken) -> str:
+    result = service.process_structured(
+        text[:MAX_INPUT_CHARS], TAGS_SCHEMA, "Suggest short topical tags for this note.",
+        name="tags", timeout=REQUEST_TIMEOUT, cancel_token=cancel_token,
+    )
+    if result.failure():
+        raise RuntimeError("; ".join(result.error_messages()))
+    return json.dumps(result.value["tags"])
+
+
+def embed(service: GenAIService, text: str, cancel_token: CancellationToken) -> str:
+    embedding = service.get_embeddings(
+        [text[:MAX_INPUT_CHARS]], timeout=REQUEST_TIMEOUT, cancel_token=cancel_token
+    )[0]
+    return json.dumps(embedding)
+
+
+def default_handlers() -> Dict[str, JobHandler]:
+    """Summaries and tags, plus embeddings when GENAI_EMBEDDING_MODEL is set."""
+    handlers = {"summary": summarize, "tags": extract_tags}
+    if os.environ.get("GENAI_EMBEDDING_MODEL"):
+        handlers["embedding"] = embed
+    return handlers
+
+
+def content_hash(kind: str, text: str) -> str:
+    return hashlib.sha256(f"{kind}\0{text}".encode("utf-8")).hexdigest()
+
+
+class JobScheduler:
+    """
+    Persistent, deduplicating job queue with an in-process worker pool.
+    """
+
+    def __init__(
+        self,
+        store: NotesStore,
+        service_factory: Callable[[], GenAIService],
+        handlers: Optional[Dict[str, JobHandler]] = None,
+        path: Optional[str] = None,
+        workers: int = 2,
+        max_attempts: int = 5,
+        backoff: float = 5.0,
+        poll_interval: float = 2.0,
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            store: Notes store to read note content from
+            service_factory: Returns the GenAI service; called lazily by workers
+            handlers: Job kind to handler mapping, defaults to default_handlers()
+            path: Queue database, defaults to the notes database
+            workers: Maximum number of jobs running concurrently
+            max_attempts: Attempts before a job is marked as failed
+            backoff: Base retry delay in seconds, doubled after each failure
+            poll_interval: Idle worker wake-up interval in seconds
+        """
+        self.store = store
+        self.service_factory = service_factory
+        self.handlers = handlers if handlers is not None else default_handlers()
+        self.path = path or store.path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+        self._wakeup = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._cancel_token = CancellationToken()
+
+    def attach(self) -> JobScheduler:
+        """
+        Enqueue work whenever a note is saved, and drop it when a note is
+        deleted. Imported notes are left for enqueue_note().
+        """
+        self.store.add_listener(self._on_note_event)
+        return self
+
+    def start(self) -> JobScheduler:
+        """Start the worker threads. Jobs left running by a previous process are requeued."""
+        self._cancel_token = CancellationToken()
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'")
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"notes-jobs-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the workers, cancelling in-flight provider calls."""
+        self._cancel_token.cancel("scheduler stopped")
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue_note(self, note_id: int, priority: int = 0) -> int:
+        """
+        Enqueue every job kind for a note.
+
+        Returns:
+            Number of jobs actually queued (deduplicated work is not counted)
+        """
+        note = self.store.get(note_id)
+        if note is None:
+            return 0
+        text = f"{note.title}\n{note.body}"
+        return sum(self.enqueue(note_id, kind, text, priority) for kind in self.handlers)
+
+    def enqueue(self, note_id: int, kind: str, text: str, priority: int = 0) -> bool:
+        """
+        Enqueue one job, unless its result is already known or queued.
+
+        Args:
+            note_id: Note the result belongs to
+            kind: Job kind, one of the handler names
+            text: Content the result is computed from
+            priority: Higher priorities run first
+
+        Returns:
+            True if a job was queued
+        """
+        digest = content_hash(kind, text)
+        now = time.time()
+
+        with self._lock, self._conn:
+            current = self._conn.execute(
+                "SELECT content_hash FROM note_results WHERE note_id = ? AND kind = ?",
+                (note_id, kind),
+            ).fetchone()
+            if current and current[0] == digest:
+                return False
+
+            # Same content seen before, possibly on another note: reuse the result
+            if self._conn.execute(
+                "SELECT 1 FROM job_results WHERE content_hash = ?", (digest,)
+            ).fetchone():
+                self._set_note_result(note_id, kind, digest)
+                self._conn.execute(
+                    "DELETE FROM jobs WHERE note_id = ? AND kind = ?", (note_id, kind)
+                )
+                return False
+
+            job = self._conn.execute(
+                "SELECT content_hash, status FROM jobs WHERE note_id = ? AND kind = ?",
+                (note_id, kind),
+            ).fetchone()
+            # A job that failed max_attempts times stays failed until the content changes
+            if job and job[0] == digest and job[1] == "failed":
+                return False
+            if job and job[0] == digest and job[1] in ("pending", "running"):
+                self._conn.execute(
+                    "UPDATE jobs SET priority = MAX(priority, ?) WHERE note_id = ? AND kind = ?",
+                    (priority, note_id, kind),
+                )
+                return False
+
+            self._conn.execute(
+                "INSERT INTO jobs (note_id, kind, content_hash, priority, next_run) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (note_id, kind) DO UPDATE SET "
+                "content_hash = excluded.content_hash, priority = excluded.priority, "
+                "status = 'pending', attempts = 0, next_run = excluded.next_run, last_error = NULL",
+                (note_id, kind, digest, priority, now),
+            )
+
+        self._wakeup.set()
+        return True
+
+    def enqueue_missing(self, note_id: int, priority: int = 0) -> int:
+        """
+        Enqueue the job kinds a note has neither a result nor a job for, such
+        as those of an imported note. Cheap to call on every page view.
+
+        Returns:
+            Number of jobs actually queued
+        """
+        with self._lock:
+            known = {
+                row[0] for row in self._conn.execute(
+                    "SELECT kind FROM note_results WHERE note_id = ? "
+                    "UNION SELECT kind FROM jobs WHERE note_id = ?",
+                    (note_id, note_id),
+                )
+            }
+        missing = [kind for kind in self.handlers if kind not in known]
+        if not missing:
+            return 0
+        note = self.store.get(note_id)
+        if note is None:
+            return 0
+        text = f"{note.title}\n{note.body}"
+        return sum(self.enqueue(note_id, kind, text, priority) for kind in missing)
+
+    def get_results(self, note_id: int) -> Dict[str, str]:
+        """Get the precomputed results for a note, keyed by job kind."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT n.kind, r.result FROM note_results n "
+                "JOIN job_results r ON r.content_hash = n.content_hash WHERE n.note_id = ?",
+                (note_id,),
+            ).fetchall()
+        return dict(rows)
+
+    def get_result(self, note_id: int, kind: str) -> Optional[str]:
+        """Get one precomputed result for a note, or None if it is not ready."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT r.result FROM note_results n "
+                "JOIN job_results r ON r.content_hash = n.content_hash "
+                "WHERE n.note_id = ? AND n.kind = ?",
+                (note_id, kind),
+            ).fetchone()
+        return row[0] if row else None
+
+    def stats(self) -> Dict[str, int]:
+        """Number of queued jobs by status."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return dict(rows)
+
+    def _on_note_event(self, event: str, note_id: int) -> None:
+        if event == "deleted":
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM jobs WHERE note_id = ?", (note_id,))
+                self._conn.execute("DELETE FROM note_results WHERE note_id = ?", (note_id,))
+        elif event != "imported":
+            self.enqueue_note(note_id)
+
+    def _work(self) -> None:
+        while not self._cancel_token.cancelled:
+            job = self._claim()
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(*job)
+
+    def _claim(self) -> Optional[tuple]:
+        with self._lock, self._conn:
+            job = self._conn.execute(
+                "SELECT id, note_id, kind, content_hash, attempts FROM jobs "
+                "WHERE status = 'pending' AND next_run <= ? "
+                "ORDER BY priority DESC, next_run LIMIT 1",
+                (time.time(),),
+            ).fetchone()
+            if job is not None:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1 WHERE id = ?",
+                    (job[0],),
+                )
+        return job
+
+    def _run(self, job_id: int, note_id: int, kind: str, digest: str, attempts: int) -> None:
+        note = self.store.get(note_id)
+        text = f"{note.title}\n{note.body}" if note else None
+
+        # The note changed or disappeared since the job was queued
+        if text is None or content_hash(kind, text) != digest:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "DELETE FROM jobs WHERE id = ? AND content_hash = ?", (job_id, digest)
+                )
+            return
+
+        try:
+            result = self.handlers[kind](self.service_factory(), text, self._cancel_token)
+        except Exception as e:
+            if self._cancel_token.cancelled:
+                # Interrupted by stop(): run again on next start, without using an attempt
+                self._requeue(job_id, digest)
+            else:
+                # Deadlines and other cancellations are failures, retried with backoff
+                self._fail(job_id, digest, attempts + 1, e)
+            return
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_results (content_hash, kind, result, created) "
+                "VALUES (?, ?, ?, ?)",
+                (digest, kind, result, time.time()),
+            )
+            self._set_note_result(note_id, kind, digest)
+            # A newer version of the note may have been queued meanwhile; keep that job
+            self._conn.execute(
+                "DELETE FROM jobs WHERE id = ? AND content_hash = ?", (job_id, digest)
+            )
+
+    def _requeue(self, job_id: int, digest: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'pending', attempts = attempts - 1 "
+                "WHERE id = ? AND content_hash = ?",
+                (job_id, digest),
+            )
+
+    def _fail(self, job_id: int, digest: str, attempts: int, error: Exception) -> None:
+        logger.error(f"Job {job_id} failed (attempt {attempts}): {error}")
+        status = "failed" if attempts >= self.max_attempts else "pending"
+        # Exponential backoff with jitter, so failing jobs do not retry in lockstep
+        delay = self.backoff * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, next_run = ?, last_error = ? "
+                "WHERE id = ? AND content_hash = ?",
+                (status, time.time() + delay, f"{error}", job_id, digest),
+            )
+
+    def _set_note_result(self, note_id: int, kind: str, digest: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO note_results (note_id, kind, content_hash) VALUES (?, ?, ?)",
+            (note_id, kind, digest),
+        )
+
+    def __repr__(self) -> str:
+        return f"JobScheduler(path={self.path}, workers={self.workers})"
+
+    def __str__(self) -> str:
+        return self.__repr__()
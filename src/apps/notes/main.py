@@ -2,15 +2,57 @@ from shared.environment import ensure_environment_initialized
 
 ensure_environment_initialized()
 
+import json
+
 import streamlit as st
 from shared import logging
+from shared.genai import get_service
 
 import utils.streamlit.streamlit_launcher as sl
+from utils.streamlit import memo
+from apps.notes.ingest import Ingestor
+from apps.notes.jobs import JobScheduler
+from apps.notes.store import open_store
 
 
 logger = logging.get_app_logger()
 
 
+@st.cache_resource
+def get_store():
+    # One store per server process, shared by all sessions
+    store = open_store()
+    # Memoized listings depend on the "notes" tag, dropped on every write
+    store.add_listener(lambda event, note_id: memo.invalidate("notes"))
+    return store
+
+
+@st.cache_resource
+def get_scheduler():
+    # Summaries, tags and embeddings are computed in the background when a
+    # note is saved, so viewing a note never waits on the provider
+    return JobScheduler(get_store(), get_service).attach().start()
+
+
+@st.cache_resource
+def get_ingestor():
+    return Ingestor(get_store())
+
+
+@memo.memoize(depends_on=["notes"], max_entries=256)
+def list_notes(query):
+    # (id, title) pairs of the notes matching `query`, or of the latest notes
+    store = get_store()
+    if query:
+        return [(hit.note.id, hit.note.title) for hit in store.search(query, limit=20)]
+    return [(note.id, note.title) for note in store.list(limit=20)]
+
+
+@memo.memoize(depends_on=["notes"])
+def count_notes():
+    return get_store().count()
+
+
 def streamlit_main():
     logger.info("Running main()")
 
@@ -21,6 +63,73 @@ def streamlit_main():
 
     st.markdown("### RDA Noteworthy 📑")
 
+    store = get_store()
+    scheduler = get_scheduler()
+
+    with st.sidebar:
+        st.markdown("#### New note")
+        with st.form("new_note", clear_on_submit=True):
+            title = st.text_input("Title")
+            body = st.text_area("Body", height=200)
+            if st.form_submit_button("Save") and title:
+                note = store.create(title, body)
+                st.session_state["note_id"] = note.id
+
+        st.markdown("#### Import")
+        with st.form("import", clear_on_submit=True):
+            files = st.file_uploader(
+                "Text, Markdown, PDF or zip files", accept_multiple_files=True
+            )
+            if st.form_submit_button("Import") and files:
+                for file in files:
+                    # Streamed to disk and chunked; known content is skipped
+                    result = get_ingestor().ingest(file, file.name)
+                    if result.duplicate:
+                        st.caption(f"{file.name}: already imported")
+                    else:
+                        st.caption(f"{file.name}: {result.new_chunks} new of {result.chunks} chunks")
+                    if result.skipped:
+                        st.warning(f"{file.name}: could not read {', '.join(result.skipped)}")
+
+    query = st.text_input("Search", placeholder="Search notes...")
+    notes = list_notes(query)
+    if query:
+        st.caption(f"{len(notes)} results")
+    else:
+        st.caption(f"{count_notes()} notes")
+
+    for note_id, title in notes:
+        if st.button(title, key=f"open_{note_id}", use_container_width=True):
+            st.session_state["note_id"] = note_id
+
+    note_id = st.session_state.get("note_id")
+    note = store.get(note_id) if note_id is not None else None
+    if note is None:
+        return
+
+    st.divider()
+    results = scheduler.get_results(note.id)
+    if len(results) < len(scheduler.handlers):
+        # Imported notes are queued when first opened
+        scheduler.enqueue_missing(note.id, priority=1)
+    if "summary" in results:
+        st.info(results["summary"])
+    if "tags" in results:
+        st.caption(" ".join(f"`{tag}`" for tag in json.loads(results["tags"])))
+
+    with st.form("edit_note"):
+        # The body is only read from the store here, for the selected note
+        title = st.text_input("Title", value=note.title)
+        body = st.text_area("Body", value=note.body, height=300)
+        save, delete = st.columns(2)
+        if save.form_submit_button("Update"):
+            store.update(note.id, title=title, body=body)
+            st.rerun()
+        if delete.form_submit_button("Delete"):
+            store.delete(note.id)
+            del st.session_state["note_id"]
+            st.rerun()
+
 
 def initializer():
     logger.info("Running initializer()")
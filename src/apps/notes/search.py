@@ -0,0 +1,404 @@
+"""
+Incrementally maintained full-text index for notes.
+
+The index lives in the same SQLite database as the notes, so memory use is
+bounded by SQLite's page cache rather than by the size of the corpus. Postings
+are updated on every write instead of being rebuilt.
+
+Each posting also stores its BM25 contribution (its impact), indexed per term
+in descending order. Queries over long posting lists read them best first and
+stop once no unread posting can change the top results, so they usually read
+a fraction of the postings of their common terms.
+"""
+import heapq
+import math
+import re
+import sqlite3
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its of on or "
+    "that the this to was were will with".split()
+)
+
+# Standard BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Upper bound on the number of index terms a prefix can expand to
+MAX_PREFIX_EXPANSIONS = 64
+
+# Queries whose terms have more postings than this in total read postings in
+# impact order with early termination, instead of scoring every posting
+EARLY_TERMINATION_POSTINGS = 2000
+# Postings read per term in the first round of early termination; each
+# further round reads twice as many, so checking whether to stop (which looks
+# at every document seen so far) happens a logarithmic number of times
+IMPACT_BATCH_SIZE = 32
+
+# Impacts are computed against a reference average document length, and are
+# recomputed when the actual average leaves this range around it. Scores stay
+# exact in between; only the bounds used for early termination get looser.
+IMPACT_DRIFT = (0.8, 1.25)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS index_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    doc_count INTEGER NOT NULL,
+    total_length INTEGER NOT NULL,
+    impact_avg REAL NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO index_stats (id, doc_count, total_length) VALUES (0, 0, 0);
+
+CREATE TABLE IF NOT EXISTS index_docs (
+    doc_id INTEGER PRIMARY KEY,
+    length INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS index_terms (
+    term TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS index_postings (
+    term TEXT NOT NULL,
+    doc_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    impact REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (term, doc_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS index_postings_doc ON index_postings (doc_id);
+"""
+
+# Created after the migration of indexes made before impacts were stored. It
+# covers the columns read in impact order, so reading it never touches the table.
+IMPACT_INDEX = (
+    "CREATE INDEX IF NOT EXISTS index_postings_impact "
+    "ON index_postings (term, impact DESC, tf)"
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens, dropping common stopwords."""
+    return [
+        token
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+def bm25_impact(tf: int, length: int, avg_length: float) -> float:
+    """BM25 contribution of a term to a document, before multiplying by the term's idf."""
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+    return tf * (BM25_K1 + 1) / (tf + norm)
+
+
+class InvertedIndex:
+    """
+    BM25 inverted index stored in SQLite tables.
+
+    The index does not manage transactions; callers are expected to wrap
+    add/remove in the same transaction as the document write so the index
+    never drifts from the documents it describes.
+    """
+
+    def __init__(self, connection: sqlite3.Connection):
+        """
+        Initialize the index on an open connection, creating tables if needed.
+
+        Args:
+            connection: SQLite connection shared with the document store
+        """
+        self._conn = connection
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.execute(IMPACT_INDEX)
+        self._conn.commit()
+
+    def add(self, doc_id: int, text: str) -> None:
+        """
+        Index a document, replacing any previous postings for it.
+
+        Args:
+            doc_id: Identifier of the document
+            text: Full text to index
+        """
+        self.remove(doc_id)
+
+        tokens = tokenize(text)
+        counts = Counter(tokens)
+
+        self._conn.execute(
+            "INSERT INTO index_docs (doc_id, length) VALUES (?, ?)",
+            (doc_id, len(tokens)),
+        )
+        impact_avg = self._update_stats(1, len(tokens))
+        self._conn.executemany(
+            "INSERT INTO index_postings (term, doc_id, tf, impact) VALUES (?, ?, ?, ?)",
+            [
+                (term, doc_id, tf, bm25_impact(tf, len(tokens), impact_avg))
+                for term, tf in counts.items()
+            ],
+        )
+        self._conn.executemany(
+            "INSERT INTO index_terms (term, df) VALUES (?, 1) "
+            "ON CONFLICT (term) DO UPDATE SET df = df + 1",
+            [(term,) for term in counts],
+        )
+
+    def remove(self, doc_id: int) -> None:
+        """
+        Remove a document from the index if it is present.
+
+        Args:
+            doc_id: Identifier of the document
+        """
+        row = self._conn.execute(
+            "SELECT length FROM index_docs WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        if row is None:
+            return
+
+        terms = [
+            (term,)
+            for (term,) in self._conn.execute(
+                "SELECT term FROM index_postings WHERE doc_id = ?", (doc_id,)
+            )
+        ]
+        self._conn.executemany(
+            "UPDATE index_terms SET df = df - 1 WHERE term = ?", terms
+        )
+        self._conn.executemany(
+            "DELETE FROM index_terms WHERE term = ? AND df <= 0", terms
+        )
+        self._conn.execute("DELETE FROM index_postings WHERE doc_id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM index_docs WHERE doc_id = ?", (doc_id,))
+        self._update_stats(-1, -row[0])
+
+    def search(
+        self, query: str, limit: int = 10, prefix: bool = True
+    ) -> List[Tuple[int, float]]:
+        """
+        Score documents against a query with BM25.
+
+        Args:
+            query: Free text query
+            limit: Maximum number of results to return
+            prefix: Treat the last query token as a prefix (search-as-you-type)
+
+        Returns:
+            List of (doc_id, score) tuples, best match first
+        """
+        tokens = tokenize(query)
+        if not tokens or limit <= 0:
+            return []
+
+        doc_count, total_length, impact_avg = self._conn.execute(
+            "SELECT doc_count, total_length, impact_avg FROM index_stats WHERE id = 0"
+        ).fetchone()
+        if doc_count == 0:
+            return []
+        avg_length = total_length / doc_count or 1.0
+
+        # Each query term maps to the index terms it matches, with their df
+        terms: Dict[str, int] = {}
+        for token in dict.fromkeys(tokens[:-1] if prefix else tokens):
+            df = self._document_frequency(token)
+            if df:
+                terms[token] = df
+        if prefix:
+            terms.update(self._expand_prefix(tokens[-1]))
+        if not terms:
+            return []
+
+        idfs = {
+            term: math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            for term, df in terms.items()
+        }
+        if sum(terms.values()) > EARLY_TERMINATION_POSTINGS:
+            return self._search_by_impact(idfs, limit, avg_length, impact_avg)
+
+        scores: Dict[int, float] = {}
+        for term, idf in idfs.items():
+            rows = self._conn.execute(
+                "SELECT p.doc_id, p.tf, d.length FROM index_postings p "
+                "JOIN index_docs d ON d.doc_id = p.doc_id WHERE p.term = ?",
+                (term,),
+            )
+            for doc_id, tf, length in rows:
+                impact = bm25_impact(tf, length, avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * impact
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def _search_by_impact(
+        self, idfs: Dict[str, float], limit: int, avg_length: float, impact_avg: float
+    ) -> List[Tuple[int, float]]:
+        # Read each term's postings best first, adding their exact contributions
+        # to the documents they belong to. Once the k-th best partial score beats
+        # the sum of the terms' bounds for unread postings, no unseen document can
+        # enter the results, and only the documents that still could are completed
+        # with primary key lookups of their missing terms.
+        ratio = impact_avg / avg_length
+        base_norm = BM25_K1 * (1 - BM25_B) * (1 - ratio)
+
+        def rescale(impact: float, tf: int) -> float:
+            # Contribution with the actual average length, from one computed with
+            # impact_avg: the length normalization scales by the ratio of the two
+            norm = tf * ((BM25_K1 + 1) / impact - 1)
+            return tf * (BM25_K1 + 1) / (tf + base_norm + ratio * norm)
+
+        def bound(impact: float) -> float:
+            # Largest contribution of any posting stored with at most this impact
+            if ratio >= 1:
+                return impact
+            return impact / (ratio + (1 - ratio) * impact / (BM25_K1 + 1))
+
+        terms = list(idfs)
+        cursors = {
+            term: self._conn.execute(
+                "SELECT doc_id, tf, impact FROM index_postings "
+                "WHERE term = ? ORDER BY impact DESC",
+                (term,),
+            )
+            for term in terms
+        }
+        bounds = dict.fromkeys(terms, 0.0)
+        scores: Dict[int, float] = {}
+        # Bit i is set once the document's posting for terms[i] has been read
+        seen: Dict[int, int] = {}
+        batch_size = IMPACT_BATCH_SIZE
+
+        while True:
+            for bit, term in enumerate(terms):
+                cursor = cursors.get(term)
+                if cursor is None:
+                    continue
+                rows = cursor.fetchmany(batch_size)
+                if len(rows) < batch_size:
+                    del cursors[term]
+                    bounds[term] = 0.0
+                else:
+                    bounds[term] = idfs[term] * bound(rows[-1][2])
+                idf, mask = idfs[term], 1 << bit
+                for doc_id, tf, impact in rows:
+                    if ratio != 1:
+                        impact = rescale(impact, tf)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * impact
+                    seen[doc_id] = seen.get(doc_id, 0) | mask
+
+            threshold = sum(bounds.values())
+            kth = 0.0
+            if len(scores) >= limit:
+                kth = heapq.nlargest(limit, scores.values())[-1]
+            if not cursors or (len(scores) >= limit and kth >= threshold):
+                break
+            batch_size *= 2
+
+        for cursor in cursors.values():
+            cursor.close()
+
+        # Complete the documents whose partial score plus the bounds of their
+        # unread terms can still reach the k-th best partial score
+        unread: Dict[int, float] = {}
+        incomplete = []
+        for doc_id, score in scores.items():
+            if score + threshold < kth:
+                continue
+            mask = seen[doc_id]
+            if mask not in unread:
+                unread[mask] = sum(
+                    bounds[term] for bit, term in enumerate(terms) if not mask >> bit & 1
+                )
+            if unread[mask] and score + unread[mask] >= kth:
+                incomplete.append(doc_id)
+        scores.update(self._score(incomplete, idfs, avg_length))
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def _score(
+        self, doc_ids: List[int], idfs: Dict[str, float], avg_length: float
+    ) -> Iterable[Tuple[int, float]]:
+        # Exact scores of documents, with primary key lookups of their postings
+        terms = list(idfs)
+        placeholders = ",".join("?" * len(terms))
+        scores: Dict[int, float] = {}
+        for start in range(0, len(doc_ids), 500):
+            batch = doc_ids[start : start + 500]
+            rows = self._conn.execute(
+                "SELECT p.doc_id, p.term, p.tf, d.length FROM index_postings p "
+                "JOIN index_docs d ON d.doc_id = p.doc_id "
+                f"WHERE p.term IN ({placeholders}) "
+                f"AND p.doc_id IN ({','.join('?' * len(batch))})",
+                (*terms, *batch),
+            )
+            for doc_id, term, tf, length in rows:
+                impact = bm25_impact(tf, length, avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idfs[term] * impact
+        return scores.items()
+
+    def _update_stats(self, docs: int, length: int) -> float:
+        # Returns the average length impacts are computed against, recomputing
+        # every impact first when the actual average has drifted too far
+        self._conn.execute(
+            "UPDATE index_stats SET doc_count = doc_count + ?, "
+            "total_length = total_length + ? WHERE id = 0",
+            (docs, length),
+        )
+        doc_count, total_length, impact_avg = self._conn.execute(
+            "SELECT doc_count, total_length, impact_avg FROM index_stats WHERE id = 0"
+        ).fetchone()
+        if doc_count == 0:
+            return impact_avg or 1.0
+        avg_length = total_length / doc_count or 1.0
+        low, high = IMPACT_DRIFT
+        if not impact_avg * low <= avg_length <= impact_avg * high:
+            self._rebuild_impacts(avg_length)
+            return avg_length
+        return impact_avg
+
+    def _rebuild_impacts(self, avg_length: float) -> None:
+        # One pass over all postings; rare, since it takes a large change of the
+        # average document length
+        self._conn.execute(
+            "UPDATE index_postings SET impact = tf * ? / (tf + ? * (1 - ? + ? * "
+            "(SELECT length FROM index_docs d WHERE d.doc_id = index_postings.doc_id) / ?))",
+            (BM25_K1 + 1, BM25_K1, BM25_B, BM25_B, avg_length),
+        )
+        self._conn.execute(
+            "UPDATE index_stats SET impact_avg = ? WHERE id = 0", (avg_length,)
+        )
+
+    def _migrate(self) -> None:
+        # Indexes created before impacts were stored get them computed once
+        columns = {
+            row[1] for row in self._conn.execute("PRAGMA table_info(index_postings)")
+        }
+        if "impact" in columns:
+            return
+        with self._conn:
+            self._conn.execute(
+                "ALTER TABLE index_postings ADD COLUMN impact REAL NOT NULL DEFAULT 0"
+            )
+            self._conn.execute(
+                "ALTER TABLE index_stats ADD COLUMN impact_avg REAL NOT NULL DEFAULT 0"
+            )
+            self._update_stats(0, 0)
+
+    def _document_frequency(self, term: str) -> Optional[int]:
+        row = self._conn.execute(
+            "SELECT df FROM index_terms WHERE term = ?", (term,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _expand_prefix(self, prefix: str) -> Dict[str, int]:
+        # Range scan on the primary key, so this stays cheap for any vocabulary size
+        rows = self._conn.execute(
+            "SELECT term, df FROM index_terms WHERE term >= ? AND term < ? "
+            "ORDER BY term LIMIT ?",
+            (prefix, prefix + "\U0010ffff", MAX_PREFIX_EXPANSIONS),
+        )
+        return dict(rows.fetchall())
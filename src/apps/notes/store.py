@@ -0,0 +1,328 @@
+"""
+SQLite backed notes storage with incremental full-text search
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from .search import InvertedIndex
+
+logger = logging.getLogger(__name__)
+
+# Listeners receive the event name ("created", "imported", "updated" or "deleted")
+# and the note id; "imported" is a note created by a bulk import
+NoteListener = Callable[[str, int], None]
+
+DEFAULT_DB_PATH = os.path.join("data", "notes.db")
+PREVIEW_LENGTH = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS notes_updated ON notes (updated);
+
+CREATE TABLE IF NOT EXISTS note_bodies (
+    note_id INTEGER PRIMARY KEY,
+    body TEXT NOT NULL
+);
+"""
+
+
+class Note:
+    """
+    Note metadata. The body is kept out of the object and loaded from the
+    store on first access, so listing or searching never reads large bodies.
+    """
+
+    def __init__(
+        self,
+        id: int,
+        title: str,
+        created: float,
+        updated: float,
+        size: int,
+        body_loader: Optional[Callable[[int], str]] = None,
+    ):
+        self.id = id
+        self.title = title
+        self.created = created
+        self.updated = updated
+        self.size = size
+        self._body_loader = body_loader
+        self._body: Optional[str] = None
+
+    @property
+    def body(self) -> str:
+        if self._body is None and self._body_loader is not None:
+            self._body = self._body_loader(self.id)
+        return self._body or ""
+
+    def __repr__(self) -> str:
+        return f"Note(id={self.id}, title={self.title!r}, size={self.size})"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+class SearchHit:
+    """A note matched by a search, with its BM25 score."""
+
+    def __init__(self, note: Note, score: float):
+        self.note = note
+        self.score = score
+
+    def __repr__(self) -> str:
+        return f"SearchHit(note={self.note}, score={self.score:.3f})"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+class NotesStore:
+    """
+    Persistent notes store. Every write updates the search index in the same
+    transaction, so search results always reflect the stored notes.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        """
+        Open (or create) a notes database.
+
+        Args:
+            path: Path to the SQLite database file, or ":memory:"
+        """
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        # Streamlit serves each session from its own thread, so share the
+        # connection across threads and serialize access with a lock
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._index = InvertedIndex(self._conn)
+        self._conn.commit()
+        self._listeners: List[NoteListener] = []
+
+    def add_listener(self, listener: NoteListener) -> None:
+        """
+        Register a callback invoked after each committed write, e.g. to
+        schedule background work for the note.
+        """
+        self._listeners.append(listener)
+
+    def create(self, title: str, body: str) -> Note:
+        """
+        Create a note and index it.
+
+        Args:
+            title: Note title
+            body: Note body
+
+        Returns:
+            The created note
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO notes (title, created, updated, size) VALUES (?, ?, ?, ?)",
+                (title, now, now, len(body)),
+            )
+            note_id = cursor.lastrowid
+            self._conn.execute(
+                "INSERT INTO note_bodies (note_id, body) VALUES (?, ?)",
+                (note_id, body),
+            )
+            self._index.add(note_id, f"{title}\n{body}")
+
+        self._notify("created", note_id)
+        return Note(note_id, title, now, now, len(body), self.get_body)
+
+    def create_many(self, notes: List[Tuple[str, str]], event: str = "created") -> List[Note]:
+        """
+        Create and index several notes in a single transaction.
+
+        Args:
+            notes: (title, body) pairs
+            event: Event sent to listeners for each note, e.g. "imported" for
+                bulk imports that should not be treated as user edits
+
+        Returns:
+            The created notes, in order
+        """
+        now = time.time()
+        created = []
+        with self._lock, self._conn:
+            for title, body in notes:
+                cursor = self._conn.execute(
+                    "INSERT INTO notes (title, created, updated, size) VALUES (?, ?, ?, ?)",
+                    (title, now, now, len(body)),
+                )
+                self._conn.execute(
+                    "INSERT INTO note_bodies (note_id, body) VALUES (?, ?)",
+                    (cursor.lastrowid, body),
+                )
+                self._index.add(cursor.lastrowid, f"{title}\n{body}")
+                created.append(Note(cursor.lastrowid, title, now, now, len(body), self.get_body))
+
+        for note in created:
+            self._notify(event, note.id)
+        return created
+
+    def update(
+        self, note_id: int, title: Optional[str] = None, body: Optional[str] = None
+    ) -> Note:
+        """
+        Update a note's title and/or body and re-index it.
+
+        Args:
+            note_id: Identifier of the note
+            title: New title, or None to keep the current one
+            body: New body, or None to keep the current one
+
+        Returns:
+            The updated note
+
+        Raises:
+            KeyError: If the note does not exist
+        """
+        with self._lock, self._conn:
+            note = self.get(note_id)
+            if note is None:
+                raise KeyError(f"Note {note_id} not found")
+
+            title = note.title if title is None else title
+            body = note.body if body is None else body
+            now = time.time()
+
+            self._conn.execute(
+                "UPDATE notes SET title = ?, updated = ?, size = ? WHERE id = ?",
+                (title, now, len(body), note_id),
+            )
+            self._conn.execute(
+                "UPDATE note_bodies SET body = ? WHERE note_id = ?", (body, note_id)
+            )
+            self._index.add(note_id, f"{title}\n{body}")
+
+        self._notify("updated", note_id)
+        return Note(note_id, title, note.created, now, len(body), self.get_body)
+
+    def delete(self, note_id: int) -> bool:
+        """
+        Delete a note and remove it from the index.
+
+        Returns:
+            True if a note was deleted
+        """
+        with self._lock, self._conn:
+            self._index.remove(note_id)
+            self._conn.execute("DELETE FROM note_bodies WHERE note_id = ?", (note_id,))
+            cursor = self._conn.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+            deleted = cursor.rowcount > 0
+
+        if deleted:
+            self._notify("deleted", note_id)
+        return deleted
+
+    def get(self, note_id: int) -> Optional[Note]:
+        """Get a note's metadata; the body is loaded on first access."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, title, created, updated, size FROM notes WHERE id = ?",
+                (note_id,),
+            ).fetchone()
+        return self._to_note(row) if row else None
+
+    def get_body(self, note_id: int) -> str:
+        """Read a note's full body."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body FROM note_bodies WHERE note_id = ?", (note_id,)
+            ).fetchone()
+        return row[0] if row else ""
+
+    def get_preview(self, note_id: int, length: int = PREVIEW_LENGTH) -> str:
+        """Read the first `length` characters of a note's body."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT substr(body, 1, ?) FROM note_bodies WHERE note_id = ?",
+                (length, note_id),
+            ).fetchone()
+        return row[0] if row else ""
+
+    def list(self, limit: int = 50, offset: int = 0) -> List[Note]:
+        """List notes, most recently updated first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, title, created, updated, size FROM notes "
+                "ORDER BY updated DESC LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return [self._to_note(row) for row in rows]
+
+    def count(self) -> int:
+        """Get the number of stored notes."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    def search(self, query: str, limit: int = 10, prefix: bool = True) -> List[SearchHit]:
+        """
+        Search notes by title and body.
+
+        Args:
+            query: Free text query
+            limit: Maximum number of hits to return
+            prefix: Treat the last query token as a prefix
+
+        Returns:
+            List of hits, best match first
+        """
+        with self._lock:
+            ranked = self._index.search(query, limit=limit, prefix=prefix)
+        hits = []
+        for note_id, score in ranked:
+            note = self.get(note_id)
+            if note is not None:
+                hits.append(SearchHit(note, score))
+        return hits
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _notify(self, event: str, note_id: int) -> None:
+        for listener in self._listeners:
+            try:
+                listener(event, note_id)
+            except Exception as e:
+                logger.error(f"Note listener failed for {event} {note_id}: {e}")
+
+    def _to_note(self, row) -> Note:
+        return Note(*row, body_loader=self.get_body)
+
+    def __repr__(self) -> str:
+        return f"NotesStore(path={self.path})"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+def open_store(path: Optional[str] = None) -> NotesStore:
+    """
+    Open the notes store at `path`, defaulting to the NOTES_DB_PATH environment
+    variable and then to data/notes.db.
+    """
+    return NotesStore(path or os.environ.get("NOTES_DB_PATH", DEFAULT_DB_PATH))
@@ -0,0 +1,429 @@
+"""
+Process-pool execution engine for the Sandbox app.
+
+Code runs in a pool of pre-warmed worker processes (see worker.py), never in
+the Streamlit script thread. Each run is forked from an idle worker, so it
+starts without interpreter startup cost. CPU time, address space and file
+sizes are capped with hard rlimits, and wall-clock time and output size are
+enforced by the worker. Output is streamed back as it is produced.
+
+Runs are isolated from the server and from each other for resources and
+crashes, and they do not see the server's environment variables (which hold
+provider keys). This is not a security boundary: runs can read the file
+system and use the network with the server's permissions.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.genai.cancellation import CancellationToken
+
+logger = logging.getLogger(__name__)
+
+WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+# Imported once per worker, so runs using them start instantly
+DEFAULT_PRELOAD = ("json", "math", "re", "random", "datetime", "collections", "itertools", "functools")
+# The only server environment variables passed to workers, and so to runs
+WORKER_ENV_VARS = ("PATH", "LANG", "LC_ALL", "LC_CTYPE", "TZ")
+# Attempts to start a worker process, and the delay before the first retry in seconds
+SPAWN_ATTEMPTS = 3
+SPAWN_BACKOFF = 0.5
+
+
+class Limits:
+    """Resource limits of one run."""
+
+    def __init__(
+        self,
+        cpu_time: float = 5.0,
+        memory_mb: int = 512,
+        wall_time: float = 10.0,
+        max_output: int = 1024 * 1024,
+        file_size_mb: int = 16,
+    ):
+        """
+        Args:
+            cpu_time: CPU seconds, rounded up to whole seconds
+            memory_mb: Address space limit, in MiB
+            wall_time: Wall-clock seconds, including time spent waiting
+            max_output: Maximum bytes of stdout and stderr combined
+            file_size_mb: Maximum size of a file written by the run, in MiB
+        """
+        self.cpu_time = cpu_time
+        self.memory_mb = memory_mb
+        self.wall_time = wall_time
+        self.max_output = max_output
+        self.file_size_mb = file_size_mb
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+    def __repr__(self) -> str:
+        return (
+            f"Limits(cpu_time={self.cpu_time}, memory_mb={self.memory_mb}, "
+            f"wall_time={self.wall_time}, max_output={self.max_output})"
+        )
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+class ExecutionResult:
+    """
+    Outcome of a run. `status` is one of "ok", "error", "timeout",
+    "cpu_limit", "memory_limit", "file_limit", "output_limit", "killed",
+    "cancelled" or "crashed".
+    """
+
+    def __init__(
+        self,
+        status: str,
+        exit_code: Optional[int] = None,
+        stdout: str = "",
+        stderr: str = "",
+        elapsed: float = 0.0,
+        cpu_time: float = 0.0,
+        max_rss: int = 0,
+    ):
+        self.status = status
+        self.exit_code = exit_code
+        self.stdout = stdout
+        self.stderr = stderr
+        self.elapsed = elapsed
+        self.cpu_time = cpu_time
+        self.max_rss = max_rss
+
+    def failure(self) -> bool:
+        return self.status != "ok"
+
+    def __repr__(self) -> str:
+        return (
+            f"ExecutionResult(status={self.status}, exit_code={self.exit_code}, "
+            f"elapsed={self.elapsed:.3f}, cpu_time={self.cpu_time:.3f}, max_rss={self.max_rss})"
+        )
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+class Execution:
+    """
+    Handle on a submitted run. Iterate stream() for live output, or call
+    wait() for the result.
+    """
+
+    def __init__(self, code: str, limits: Limits):
+        self.id = uuid.uuid4().hex
+        self.code = code
+        self.limits = limits
+        self.result: Optional[ExecutionResult] = None
+
+        self._state = "queued"
+        self._worker: Optional[_Worker] = None
+        self._output: Dict[str, List[str]] = {"stdout": [], "stderr": []}
+        self._events: queue.Queue = queue.Queue()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._on_finish: List[Callable[[], None]] = []
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def stream(self) -> Iterator[Tuple[str, str]]:
+        """
+        Yield ("stdout" | "stderr", text) pieces as they are produced, until
+        the run finishes. Meant for a single consumer.
+        """
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            yield event
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[ExecutionResult]:
+        """Wait for the run to finish; returns None if `timeout` passes first."""
+        self._done.wait(timeout)
+        return self.result
+
+    def cancel(self) -> None:
+        """Cancel the run, killing it if it already started."""
+        with self._lock:
+            state, worker = self._state, self._worker
+            if state == "queued":
+                self._state = "cancelling"
+        if state == "queued":
+            self._finish(ExecutionResult("cancelled"))
+        elif state == "running" and worker is not None:
+            worker.send({"type": "cancel", "id": self.id})
+
+    def _start(self, worker: _Worker) -> bool:
+        with self._lock:
+            if self._state != "queued":
+                return False
+            self._state = "running"
+            self._worker = worker
+            return True
+
+    def _append(self, stream: str, text: str) -> None:
+        self._output[stream].append(text)
+        self._events.put((stream, text))
+
+    def _finish(self, result: ExecutionResult) -> None:
+        with self._lock:
+            if self._done.is_set():
+                return
+            self._state = "done"
+            self._worker = None
+        result.stdout = "".join(self._output["stdout"])
+        result.stderr = "".join(self._output["stderr"])
+        self.result = result
+        self._done.set()
+        self._events.put(None)
+        for callback in self._on_finish:
+            callback()
+
+    def __repr__(self) -> str:
+        return f"Execution(id={self.id}, state={self._state})"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+class _Worker:
+    # One worker process, fed by one thread of the server
+
+    def __init__(self, pool: ExecutionPool, index: int):
+        self.pool = pool
+        self.index = index
+        self.process: Optional[subprocess.Popen] = None
+        self.busy = False
+        self.alive = True
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._loop, name=f"sandbox-worker-{index}", daemon=True
+        )
+
+    def start(self) -> None:
+        # Workers warm up in the background; runs submitted meanwhile are queued
+        self._thread.start()
+
+    def send(self, message: Dict[str, Any]) -> None:
+        line = (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._write_lock:
+            try:
+                self.process.stdin.write(line)
+                self.process.stdin.flush()
+            except (OSError, ValueError, AttributeError) as e:
+                logger.error(f"Sandbox worker {self.index} is not reachable: {e}")
+
+    def stop(self) -> None:
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+
+    def _spawn(self) -> None:
+        env = {name: os.environ[name] for name in WORKER_ENV_VARS if name in os.environ}
+        env["SANDBOX_PRELOAD"] = ",".join(self.pool.preload)
+        self.process = subprocess.Popen(
+            [sys.executable, WORKER_PATH],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=env,
+        )
+        message = self._receive()
+        if message is None or message["type"] != "ready":
+            raise RuntimeError(f"Sandbox worker {self.index} failed to start")
+        self.pool.stats["started"] += 1
+
+    def _loop(self) -> None:
+        while self._start_process():
+            while True:
+                execution = self.pool._queue.get()
+                if execution is None:
+                    return
+                if not execution._start(self):
+                    continue
+
+                self.busy = True
+                try:
+                    self._execute(execution)
+                except Exception as e:
+                    logger.error(f"Sandbox worker {self.index} failed: {e}")
+                    execution._finish(ExecutionResult("crashed"))
+                    self.stop()
+                    break
+                finally:
+                    self.busy = False
+
+        self.alive = False
+        self.pool._worker_exited()
+
+    def _start_process(self) -> bool:
+        # Starts the worker process, retrying with exponential backoff
+        delay = SPAWN_BACKOFF
+        for attempt in range(1, SPAWN_ATTEMPTS + 1):
+            if self.pool.closed:
+                return False
+            try:
+                self._spawn()
+                return True
+            except Exception as e:
+                logger.error(f"Could not start sandbox worker {self.index} (attempt {attempt}): {e}")
+                self.stop()
+            if attempt < SPAWN_ATTEMPTS:
+                time.sleep(delay)
+                delay *= 2
+        return False
+
+    def _execute(self, execution: Execution) -> None:
+        self.send({
+            "type": "run",
+            "id": execution.id,
+            "code": execution.code,
+            "limits": execution.limits.to_dict(),
+        })
+        while True:
+            message = self._receive()
+            if message is None:
+                # The worker itself died; runs execute in its children, so
+                # this should not happen, but the pool must survive it
+                raise RuntimeError("worker exited")
+            if message.get("id") != execution.id:
+                continue
+            if message["type"] == "output":
+                execution._append(message["stream"], message["data"])
+            elif message["type"] == "done":
+                execution._finish(ExecutionResult(
+                    message["status"],
+                    message["exit_code"],
+                    elapsed=message["elapsed"],
+                    cpu_time=message["cpu_time"],
+                    max_rss=message["max_rss"],
+                ))
+                self.pool.stats["completed"] += 1
+                return
+
+    def _receive(self) -> Optional[Dict[str, Any]]:
+        line = self.process.stdout.readline()
+        return json.loads(line) if line else None
+
+
+class ExecutionPool:
+    """
+    Pool of pre-warmed worker processes running code snippets concurrently.
+    Runs beyond the number of workers wait in a FIFO queue.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        limits: Optional[Limits] = None,
+        preload: Tuple[str, ...] = DEFAULT_PRELOAD,
+    ):
+        """
+        Start the worker processes.
+
+        Args:
+            workers: Number of worker processes, i.e. of concurrent runs
+            limits: Default limits of each run
+            preload: Modules imported by each worker before any run
+        """
+        self.limits = limits or Limits()
+        self.preload = preload
+        self.stats = {"started": 0, "submitted": 0, "completed": 0}
+        self.closed = False
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = [_Worker(self, i) for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(
+        self,
+        code: str,
+        limits: Optional[Limits] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> Execution:
+        """
+        Queue code for execution.
+
+        Args:
+            code: Python source to run as __main__
+            limits: Limits of this run, defaults to the pool's limits
+            cancel_token: Optional token; cancelling it cancels the run
+
+        Returns:
+            Handle on the run
+        """
+        execution = Execution(code, limits or self.limits)
+        if cancel_token is not None:
+            execution._on_finish.append(cancel_token.add_callback(execution.cancel))
+        self.stats["submitted"] += 1
+        with self._lock:
+            if not any(worker.alive for worker in self._workers):
+                # Nothing would ever pick the run up
+                execution._finish(ExecutionResult("crashed"))
+            else:
+                self._queue.put(execution)
+        return execution
+
+    def run(
+        self,
+        code: str,
+        limits: Optional[Limits] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> ExecutionResult:
+        """Run code and wait for its result."""
+        return self.submit(code, limits, cancel_token).wait()
+
+    def status(self) -> Dict[str, int]:
+        """Number of live workers, busy workers and queued runs."""
+        return {
+            "workers": sum(worker.alive for worker in self._workers),
+            "busy": sum(worker.busy for worker in self._workers),
+            "queued": self._queue.qsize(),
+            **self.stats,
+        }
+
+    def _worker_exited(self) -> None:
+        # Once no worker is left, queued runs are failed instead of waiting forever
+        with self._lock:
+            if self.closed or any(worker.alive for worker in self._workers):
+                return
+            logger.error("No sandbox worker is running; failing queued runs")
+            while True:
+                try:
+                    execution = self._queue.get_nowait()
+                except queue.Empty:
+                    return
+                execution._finish(ExecutionResult("crashed"))
+
+    def close(self) -> None:
+        """Stop the workers. Queued runs are cancelled."""
+        self.closed = True
+        while True:
+            try:
+                execution = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            execution.cancel()
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.stop()
+
+    def __repr__(self) -> str:
+        return f"ExecutionPool(workers={len(self._workers)}, limits={self.limits})"
+
+    def __str__(self) -> str:
+        return self.__repr__()
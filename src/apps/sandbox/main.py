@@ -2,13 +2,32 @@ from shared.environment import ensure_environment_initialized
 
 ensure_environment_initialized()
 
+import os
+import time
+
 import streamlit as st
 import utils.streamlit.streamlit_launcher as sl
 
 from shared import logging
+from apps.sandbox.executor import ExecutionPool, Limits
 
 logger = logging.get_app_logger()
 
+# Seconds between output refreshes while a run is streaming
+REFRESH_INTERVAL = 0.1
+EXAMPLE_CODE = """import time
+
+for i in range(5):
+    print(f"step {i}")
+    time.sleep(0.5)
+"""
+
+
+@st.cache_resource
+def get_pool():
+    # Started once per server process; workers are shared by all sessions
+    return ExecutionPool(workers=int(os.environ.get("SANDBOX_WORKERS", 4)))
+
 
 def streamlit_main():
     logger.info("Running main()")
@@ -21,6 +40,48 @@ def streamlit_main():
 
     st.markdown("### Noteworthy Sandbox :building_construction:")
 
+    pool = get_pool()
+
+    with st.sidebar:
+        st.markdown("#### Limits")
+        cpu_time = st.slider("CPU time (s)", 1, 60, 5)
+        wall_time = st.slider("Wall time (s)", 1, 120, 10)
+        memory_mb = st.slider("Memory (MiB)", 64, 2048, 512, 64)
+        status = pool.status()
+        st.caption(f"{status['busy']}/{status['workers']} workers busy, {status['queued']} queued")
+
+    code = st.text_area("Python", value=EXAMPLE_CODE, height=300)
+    if not st.button("Run", type="primary"):
+        return
+
+    # Runs in a worker process; cancelled if the user reruns or leaves
+    execution = pool.submit(
+        code,
+        Limits(cpu_time=cpu_time, wall_time=wall_time, memory_mb=memory_mb),
+        cancel_token=sl.run_cancel_token(),
+    )
+
+    placeholder = st.empty()
+    output = []
+    refreshed = 0.0
+    for _, text in execution.stream():
+        output.append(text)
+        # Redraw at most every REFRESH_INTERVAL, not for every chunk
+        if time.monotonic() - refreshed >= REFRESH_INTERVAL:
+            placeholder.code("".join(output), language="text")
+            refreshed = time.monotonic()
+    placeholder.code("".join(output), language="text")
+
+    result = execution.wait()
+    summary = (
+        f"{result.status} (exit code {result.exit_code}) in {result.elapsed:.2f}s, "
+        f"CPU {result.cpu_time:.2f}s, peak memory {result.max_rss / 1024:.0f} MiB"
+    )
+    if result.failure():
+        st.error(summary)
+    else:
+        st.success(summary)
+
 
 def initializer():
     logger.info("Running initializer()")
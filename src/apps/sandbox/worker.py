@@ -0,0 +1,304 @@
+"""
+Sandbox worker process, started and driven by apps.sandbox.executor.
+
+The worker is a long-lived Python process that imports the preloaded
+modules once. For each run it forks a child that inherits the warm
+interpreter, applies hard resource limits, executes the code and exits, so
+runs never pay interpreter startup and never see each other's state.
+
+Protocol: one JSON message per line. The pool writes to the worker's stdin:
+
+    {"type": "run", "id": ..., "code": ..., "limits": {...}}
+    {"type": "cancel", "id": ...}
+
+and the worker answers on its stdout:
+
+    {"type": "ready", "pid": ...}
+    {"type": "output", "id": ..., "stream": "stdout" | "stderr", "data": ...}
+    {"type": "done", "id": ..., "status": ..., "exit_code": ..., ...}
+
+Only the standard library is used here: the worker runs as a plain script,
+outside the application's import path.
+"""
+import codecs
+import importlib
+import json
+import os
+import resource
+import selectors
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import traceback
+
+READ_SIZE = 65536
+# Exit code of a run that ran out of memory
+MEMORY_EXIT_CODE = 125
+# How often a run is polled for exit once its output pipes are closed, in seconds
+EXIT_POLL_INTERVAL = 0.01
+# How often a run with open output pipes is checked for exit, in seconds
+EXIT_CHECK_INTERVAL = 0.1
+
+
+class _Control:
+    # Line-based JSON channel to the pool, on file descriptors of our own
+    def __init__(self, in_fd, out_fd):
+        self.in_fd = in_fd
+        self.out_fd = out_fd
+        self.closed = False
+        self._buffer = b""
+
+    def send(self, message):
+        data = (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+        while data:
+            data = data[os.write(self.out_fd, data):]
+
+    def receive(self):
+        """Block until a message arrives; None once the pool is gone."""
+        while b"\n" not in self._buffer:
+            if not self._fill():
+                return None
+        return self._pop()
+
+    def receive_available(self):
+        """Read once, without blocking past one read, and return complete messages."""
+        self._fill()
+        messages = []
+        while b"\n" in self._buffer:
+            messages.append(self._pop())
+        return messages
+
+    def _fill(self):
+        data = os.read(self.in_fd, READ_SIZE)
+        if not data:
+            self.closed = True
+        self._buffer += data
+        return bool(data)
+
+    def _pop(self):
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return json.loads(line)
+
+
+def main():
+    # Keep the protocol off fds 0 and 1, so stray prints (from preloaded
+    # modules, or this file) cannot corrupt it
+    control = _Control(os.dup(0), os.dup(1))
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(2, 1)
+
+    for name in filter(None, os.environ.get("SANDBOX_PRELOAD", "").split(",")):
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"Sandbox worker could not preload {name}: {e}", file=sys.stderr)
+
+    control.send({"type": "ready", "pid": os.getpid()})
+    while True:
+        message = control.receive()
+        if message is None:
+            return
+        # A cancel arriving after its run finished is ignored
+        if message["type"] == "run":
+            control.send(_run(control, message))
+
+
+def _run(control, message):
+    run_id = message["id"]
+    limits = message["limits"]
+    workdir = tempfile.mkdtemp(prefix="sandbox-")
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+
+    started = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        _child(message["code"], limits, workdir, out_w, err_w)
+
+    os.close(out_w)
+    os.close(err_w)
+    deadline = started + limits["wall_time"]
+    status = None
+    output_size = 0
+
+    streams = {out_r: "stdout", err_r: "stderr"}
+    decoders = {fd: codecs.getincrementaldecoder("utf-8")(errors="replace") for fd in streams}
+    selector = selectors.DefaultSelector()
+    for fd in streams:
+        selector.register(fd, selectors.EVENT_READ)
+    selector.register(control.in_fd, selectors.EVENT_READ)
+
+    def forward(fd, data):
+        nonlocal output_size, status
+        output_size += len(data)
+        if output_size > limits["max_output"]:
+            data = data[: len(data) - (output_size - limits["max_output"])]
+            status = "output_limit"
+        text = decoders[fd].decode(data)
+        if text:
+            control.send({"type": "output", "id": run_id, "stream": streams[fd], "data": text})
+
+    while streams and status is None:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            status = "timeout"
+            break
+        # Wake up regularly: processes started by the run can keep the pipes
+        # open after the run itself exited
+        for key, _ in selector.select(min(timeout, EXIT_CHECK_INTERVAL)):
+            if key.fd == control.in_fd:
+                for request in control.receive_available():
+                    if request["type"] == "cancel" and request["id"] == run_id:
+                        status = "cancelled"
+                if control.closed:
+                    selector.unregister(control.in_fd)
+                    status = "cancelled"
+                continue
+
+            data = os.read(key.fd, READ_SIZE)
+            if data:
+                forward(key.fd, data)
+            else:
+                selector.unregister(key.fd)
+                os.close(key.fd)
+                del streams[key.fd]
+
+        if streams and status is None and _exited(pid):
+            # Forward what is left without waiting for the pipes to close
+            for fd in list(streams):
+                os.set_blocking(fd, False)
+                while status is None:
+                    try:
+                        data = os.read(fd, READ_SIZE)
+                    except BlockingIOError:
+                        break
+                    if not data:
+                        break
+                    forward(fd, data)
+            break
+
+    if status is not None:
+        _kill(pid)
+    wait_status, usage = _wait(pid, deadline)
+    if wait_status is None:
+        status = status or "timeout"
+        _kill(pid)
+        _, wait_status, usage = os.wait4(pid, 0)
+    # Processes started by the run belong to its session; none may outlive it
+    _kill(pid)
+
+    selector.close()
+    for fd in streams:
+        os.close(fd)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    cpu_time = usage.ru_utime + usage.ru_stime
+    exit_code = os.waitstatus_to_exitcode(wait_status)
+    if status is None:
+        status = _status(wait_status, exit_code, cpu_time, limits)
+
+    return {
+        "type": "done",
+        "id": run_id,
+        "status": status,
+        "exit_code": exit_code,
+        "elapsed": time.monotonic() - started,
+        "cpu_time": cpu_time,
+        "max_rss": usage.ru_maxrss,
+    }
+
+
+def _child(code, limits, workdir, out_w, err_w):
+    exit_code = 1
+    try:
+        os.setsid()
+        os.dup2(out_w, 1)
+        os.dup2(err_w, 2)
+        # Drop every other inherited descriptor, including the control channel
+        os.closerange(3, resource.getrlimit(resource.RLIMIT_NOFILE)[0])
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", buffering=1, closefd=False)
+        sys.stderr = open(2, "w", buffering=1, closefd=False)
+        for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGPIPE, signal.SIGXFSZ):
+            signal.signal(signum, signal.SIG_DFL)
+        os.chdir(workdir)
+        # The pool passes the worker an allow-listed environment; give the run
+        # its own home and temporary directory on top of it
+        os.environ["HOME"] = os.environ["TMPDIR"] = workdir
+        tempfile.tempdir = None
+
+        # Hard limits: the code cannot raise them back
+        cpu_time = max(1, int(limits["cpu_time"] + 0.999))
+        memory = limits["memory_mb"] * 1024 * 1024
+        file_size = limits["file_size_mb"] * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_time, cpu_time + 1))
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (file_size, file_size))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+        # Tracebacks show the source lines of the snippet
+        import linecache
+
+        linecache.cache["<sandbox>"] = (len(code), None, code.splitlines(True), "<sandbox>")
+        exec(compile(code, "<sandbox>", "exec"), {"__name__": "__main__"})
+        exit_code = 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            exit_code = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+    except MemoryError:
+        print("MemoryError: memory limit exceeded", file=sys.stderr)
+        exit_code = MEMORY_EXIT_CODE
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except BaseException:
+            pass
+        os._exit(exit_code)
+
+
+def _exited(pid):
+    # Checks for exit without reaping, so wait4 can still collect the usage
+    return os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+
+
+def _wait(pid, deadline):
+    # The output pipes can close before the process exits; wait for it until the deadline
+    while True:
+        waited, wait_status, usage = os.wait4(pid, os.WNOHANG)
+        if waited:
+            return wait_status, usage
+        if time.monotonic() >= deadline:
+            return None, None
+        time.sleep(EXIT_POLL_INTERVAL)
+
+
+def _kill(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _status(wait_status, exit_code, cpu_time, limits):
+    if os.WIFSIGNALED(wait_status):
+        signum = os.WTERMSIG(wait_status)
+        if signum == signal.SIGXCPU or (signum == signal.SIGKILL and cpu_time >= limits["cpu_time"]):
+            return "cpu_limit"
+        if signum == signal.SIGXFSZ:
+            return "file_limit"
+        return "killed"
+    if exit_code == MEMORY_EXIT_CODE:
+        return "memory_limit"
+    return "ok" if exit_code == 0 else "error"
+
+
+if __name__ == "__main__":
+    main()
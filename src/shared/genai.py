@@ -4,29 +4,62 @@ ensure_environment_initialized()
 
 import os
 from utils.env_builder import require
-from utils.genai import openai_provider as genai_provider
+from utils.genai.cassette import RecordingClient, ReplayClient
+from utils.genai.genai_service import GenAIService
 
 _genai_service = None
 
+DEFAULT_CASSETTE_PATH = os.path.join("cassettes", "genai.cassette")
+
 
-@require("GENAI_BASE_URL", "GENAI_API_KEY", "GENAI_DEFAULT_MODEL")
 def get_service():
     """
     Returns the GenAI service, initializing it only on first call.
+
+    GENAI_CASSETTE_MODE selects how the service talks to the provider:
+        off     Live provider (default)
+        record  Live provider, recording every call to GENAI_CASSETTE_PATH
+        replay  No provider; calls are served from GENAI_CASSETTE_PATH with
+                GENAI_REPLAY_LATENCY latency ("original", "zero" or a scale factor)
     """
     global _genai_service
 
+    if _genai_service is None:
+        mode = os.environ.get("GENAI_CASSETTE_MODE", "off").lower()
+        cassette_path = os.environ.get("GENAI_CASSETTE_PATH", DEFAULT_CASSETTE_PATH)
+
+        if mode == "replay":
+            client = ReplayClient(
+                cassette_path,
+                latency=os.environ.get("GENAI_REPLAY_LATENCY", "original"),
+                model=os.environ.get("GENAI_DEFAULT_MODEL"),
+            )
+            _genai_service = GenAIService(client)
+        elif mode == "record":
+            service = _create_provider_service()
+            _genai_service = GenAIService(RecordingClient(service.client, cassette_path))
+        elif mode == "off":
+            _genai_service = _create_provider_service()
+        else:
+            raise ValueError(f"Unknown GENAI_CASSETTE_MODE: {mode}")
+
+    return _genai_service
+
+
+@require("GENAI_BASE_URL", "GENAI_API_KEY", "GENAI_DEFAULT_MODEL")
+def _create_provider_service():
+    # Imported here so replay mode does not need the provider SDK
+    from utils.genai import openai_provider as genai_provider
+
     # Configuration values
     base_url = os.environ.get("GENAI_BASE_URL")
     api_key = os.environ.get("GENAI_API_KEY")
     default_model = os.environ.get("GENAI_DEFAULT_MODEL")
+    embedding_model = os.environ.get("GENAI_EMBEDDING_MODEL")
 
-    if _genai_service is None:
-        _genai_service = genai_provider.create_genai_service(
-            base_url, api_key, default_model
-        )
-
-    return _genai_service
+    return genai_provider.create_genai_service(
+        base_url, api_key, default_model, embedding_model=embedding_model
+    )
 
 
 def reset_service():
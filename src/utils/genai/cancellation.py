@@ -0,0 +1,144 @@
+"""
+Cancellation tokens and deadlines for in-flight GenAI calls
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, List, Optional
+
+
+class RequestCancelled(Exception):
+    """Raised (or reported in a failed response) when a request is cancelled."""
+
+
+class DeadlineExceeded(RequestCancelled):
+    """Raised (or reported in a failed response) when a request runs past its deadline."""
+
+
+class CancellationToken:
+    """
+    Thread-safe cancellation signal with an optional deadline.
+
+    A token is cancelled explicitly with cancel(), when its deadline passes,
+    or when its parent token is cancelled. Callbacks registered with
+    add_callback run once, on the thread that cancels the token. Deadline
+    expiry is detected lazily, when the token is checked.
+    """
+
+    def __init__(
+        self, timeout: Optional[float] = None, parent: Optional[CancellationToken] = None
+    ):
+        """
+        Initialize a token.
+
+        Args:
+            timeout: Optional number of seconds until the deadline
+            parent: Optional parent token; cancelling it cancels this token too
+        """
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        if parent is not None and parent.deadline is not None:
+            self.deadline = min(self.deadline or parent.deadline, parent.deadline)
+
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self._unlink: Optional[Callable[[], None]] = None
+        if parent is not None:
+            self._unlink = parent.add_callback(lambda: self.cancel(parent.reason))
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.deadline is not None:
+            if time.monotonic() >= self.deadline:
+                self.cancel("deadline exceeded")
+        return self._event.is_set()
+
+    def cancel(self, reason: Optional[str] = None) -> None:
+        """Cancel the token and run its callbacks. Later calls have no effect."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason or "cancelled"
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        self.release()
+        for callback in callbacks:
+            callback()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the deadline, or None if there is no deadline."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Register a callback to run on cancellation. If the token is already
+        cancelled, the callback runs immediately.
+
+        Returns:
+            A function that unregisters the callback
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove_callback(callback)
+        callback()
+        return lambda: None
+
+    def child(self, timeout: Optional[float] = None) -> CancellationToken:
+        """Create a token that is cancelled with this one, optionally with a tighter deadline."""
+        return CancellationToken(timeout, parent=self)
+
+    def release(self) -> None:
+        """Detach from the parent token so a finished call does not stay registered on it."""
+        if self._unlink:
+            self._unlink()
+            self._unlink = None
+
+    def error(self) -> RequestCancelled:
+        """The exception describing why this token was cancelled."""
+        if self.reason == "deadline exceeded":
+            return DeadlineExceeded(self.reason)
+        return RequestCancelled(self.reason or "cancelled")
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise self.error()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the token is cancelled or `timeout` seconds pass."""
+        remaining = self.remaining()
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        self._event.wait(timeout)
+        return self.cancelled
+
+    def _remove_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def __repr__(self) -> str:
+        return f"CancellationToken(cancelled={self.cancelled}, remaining={self.remaining()})"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+def combine(
+    timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None
+) -> Optional[CancellationToken]:
+    """
+    Build the token for a single call from an optional timeout and an
+    optional caller token. Returns None when neither is given.
+
+    The caller's token is never returned directly: the call gets a child
+    token, which it releases when done without affecting the caller's token.
+    """
+    if cancel_token is None:
+        return CancellationToken(timeout) if timeout is not None else None
+    return cancel_token.child(timeout)
@@ -0,0 +1,313 @@
+"""
+Record/replay ("cassette") clients for deterministic, offline GenAI runs.
+
+RecordingClient wraps a live client and appends every request/response pair,
+including streamed chunks and their timing, to a cassette file. ReplayClient
+implements GenAIClientProtocol on top of a cassette, serving the recorded
+responses with their original, scaled or zero latency.
+
+A cassette is a text file with one record per line, formatted as
+"<request key>\t<json record>". The key comes first so that opening a
+cassette only splits each line, without parsing the JSON, to build the
+key -> offsets index. Records are then read lazily with a seek.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from .compact_response import CompactGenAIResponse
+from .genai_interface import GenAIClientProtocol, GenAIResponseProtocol
+
+Latency = Union[str, float]
+
+
+def request_key(method: str, **request: Any) -> str:
+    """Stable hash identifying a request; the timeout is not part of it."""
+    payload = json.dumps({"method": method, **request}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def _prompt_messages(prompt: str, context: Optional[str]) -> List[Dict[str, str]]:
+    # Same message layout as OpenAIClient, so completion and chat records match
+    messages = []
+    if context:
+        messages.append({"role": "developer", "content": context})
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+def _to_record(response: GenAIResponseProtocol) -> Dict[str, Any]:
+    if isinstance(response, CompactGenAIResponse):
+        return response.to_dict()
+    return response.compact().to_dict()
+
+
+class RecordingClient:
+    """
+    Wraps a GenAI client and records every request/response pair to a cassette.
+    Interrupted or cancelled streams are not recorded.
+    """
+
+    def __init__(self, client: GenAIClientProtocol, path: str):
+        """
+        Initialize the recorder.
+
+        Args:
+            client: The live client to forward requests to
+            path: Cassette file to append records to
+        """
+        self.client = client
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    @property
+    def base_url(self) -> str:
+        return self.client.base_url
+
+    @property
+    def model(self) -> str:
+        return self.client.model
+
+    def get_active_model_names(self, timeout: Optional[float] = None) -> List[str]:
+        started = time.perf_counter()
+        names = self.client.get_active_model_names(timeout=timeout)
+        self._record(request_key("models"), {"models": names}, started)
+        return names
+
+    def embed(self, texts, model=None, timeout=None):
+        started = time.perf_counter()
+        embeddings = self.client.embed(texts, model, timeout=timeout)
+        self._record(
+            request_key("embed", texts=texts, model=model),
+            {"embeddings": embeddings},
+            started,
+        )
+        return embeddings
+
+    def completion(self, prompt, context=None, model=None, temperature=0, timeout=None):
+        return self.chat(_prompt_messages(prompt, context), model, temperature, timeout=timeout)
+
+    async def async_completion(self, prompt, context=None, model=None, temperature=0, timeout=None):
+        return await self.async_chat(
+            _prompt_messages(prompt, context), model, temperature, timeout=timeout
+        )
+
+    def chat(self, messages, model=None, temperature=0, response_format=None, timeout=None):
+        started = time.perf_counter()
+        response = self.client.chat(messages, model, temperature, response_format, timeout=timeout)
+        self._record_response(messages, model, temperature, response_format, response, started)
+        return response
+
+    async def async_chat(self, messages, model=None, temperature=0, response_format=None, timeout=None):
+        started = time.perf_counter()
+        response = await self.client.async_chat(
+            messages, model, temperature, response_format, timeout=timeout
+        )
+        self._record_response(messages, model, temperature, response_format, response, started)
+        return response
+
+    def stream_chat(self, messages, model=None, temperature=0, response_format=None, timeout=None):
+        started = time.perf_counter()
+        chunks = []
+        for delta in self.client.stream_chat(
+            messages, model, temperature, response_format, timeout=timeout
+        ):
+            chunks.append([round(time.perf_counter() - started, 4), delta])
+            yield delta
+        self._record_stream(messages, model, temperature, response_format, chunks, started)
+
+    async def async_stream_chat(self, messages, model=None, temperature=0, response_format=None, timeout=None):
+        started = time.perf_counter()
+        chunks = []
+        async for delta in self.client.async_stream_chat(
+            messages, model, temperature, response_format, timeout=timeout
+        ):
+            chunks.append([round(time.perf_counter() - started, 4), delta])
+            yield delta
+        self._record_stream(messages, model, temperature, response_format, chunks, started)
+
+    def _record_response(self, messages, model, temperature, response_format, response, started):
+        key = request_key(
+            "chat", messages=messages, model=model or self.model,
+            temperature=temperature, response_format=response_format,
+        )
+        self._record(key, {"response": _to_record(response)}, started)
+
+    def _record_stream(self, messages, model, temperature, response_format, chunks, started):
+        key = request_key(
+            "stream_chat", messages=messages, model=model or self.model,
+            temperature=temperature, response_format=response_format,
+        )
+        self._record(key, {"chunks": chunks}, started)
+
+    def _record(self, key: str, record: Dict[str, Any], started: float) -> None:
+        record["elapsed"] = round(time.perf_counter() - started, 4)
+        line = f"{key}\t{json.dumps(record, separators=(',', ':'))}\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def __repr__(self) -> str:
+        return f"RecordingClient(client={self.client}, path={self.path})"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+class ReplayClient:
+    """
+    GenAI client serving responses from a cassette, without a provider.
+
+    Identical requests recorded several times are replayed in recording
+    order; once exhausted, the last recording is served again. Requests that
+    were never recorded get a failed response (or LookupError for streams).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        latency: Latency = "original",
+        model: Optional[str] = None,
+        base_url: Optional[str] = None,
+    ):
+        """
+        Initialize the replay client.
+
+        Args:
+            path: Cassette file to replay
+            latency: "original" to replay recorded timing, "zero" for none, or
+                a float scale factor applied to the recorded timing
+            model: Default model, used when requests do not name one
+            base_url: Reported base URL, defaults to replay://<path>
+        """
+        self.path = path
+        self.model = model
+        self.base_url = base_url or f"replay://{path}"
+        self.scale = _latency_scale(latency)
+
+        self._index: Dict[str, List[int]] = {}
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._build_index()
+
+    def get_active_model_names(self, timeout: Optional[float] = None) -> List[str]:
+        record = self._next(request_key("models"))
+        if record is None:
+            return [self.model] if self.model else []
+        time.sleep(self._delay(record["elapsed"]))
+        return record["models"]
+
+    def embed(self, texts, model=None, timeout=None):
+        record = self._next(request_key("embed", texts=texts, model=model))
+        if record is None:
+            raise LookupError("No recorded embeddings for this request")
+        time.sleep(self._delay(record["elapsed"]))
+        return record["embeddings"]
+
+    def completion(self, prompt, context=None, model=None, temperature=0, timeout=None):
+        return self.chat(_prompt_messages(prompt, context), model, temperature, timeout=timeout)
+
+    async def async_completion(self, prompt, context=None, model=None, temperature=0, timeout=None):
+        return await self.async_chat(
+            _prompt_messages(prompt, context), model, temperature, timeout=timeout
+        )
+
+    def chat(self, messages, model=None, temperature=0, response_format=None, timeout=None):
+        record, delay = self._lookup("chat", messages, model, temperature, response_format, timeout)
+        time.sleep(delay)
+        return self._response(record, delay, timeout)
+
+    async def async_chat(self, messages, model=None, temperature=0, response_format=None, timeout=None):
+        record, delay = self._lookup("chat", messages, model, temperature, response_format, timeout)
+        await asyncio.sleep(delay)
+        return self._response(record, delay, timeout)
+
+    def stream_chat(self, messages, model=None, temperature=0, response_format=None, timeout=None):
+        record = self._stream_record(messages, model, temperature, response_format)
+        started = time.perf_counter()
+        for offset, delta in record["chunks"]:
+            time.sleep(max(0.0, self._delay(offset) - (time.perf_counter() - started)))
+            yield delta
+
+    async def async_stream_chat(self, messages, model=None, temperature=0, response_format=None, timeout=None):
+        record = self._stream_record(messages, model, temperature, response_format)
+        started = time.perf_counter()
+        for offset, delta in record["chunks"]:
+            await asyncio.sleep(max(0.0, self._delay(offset) - (time.perf_counter() - started)))
+            yield delta
+
+    def _lookup(self, method, messages, model, temperature, response_format, timeout):
+        key = request_key(
+            method, messages=messages, model=model or self.model,
+            temperature=temperature, response_format=response_format,
+        )
+        record = self._next(key)
+        delay = self._delay(record["elapsed"]) if record else 0.0
+        if timeout is not None:
+            delay = min(delay, timeout)
+        return record, delay
+
+    def _response(self, record, delay, timeout) -> CompactGenAIResponse:
+        if record is None:
+            return CompactGenAIResponse(error="No recorded response for this request")
+        if timeout is not None and self._delay(record["elapsed"]) > timeout:
+            return CompactGenAIResponse(error="Request timed out.", elapsed=delay)
+        return CompactGenAIResponse.from_dict(record["response"])
+
+    def _stream_record(self, messages, model, temperature, response_format) -> Dict[str, Any]:
+        key = request_key(
+            "stream_chat", messages=messages, model=model or self.model,
+            temperature=temperature, response_format=response_format,
+        )
+        record = self._next(key)
+        if record is None:
+            raise LookupError("No recorded stream for this request")
+        return record
+
+    def _delay(self, seconds: float) -> float:
+        return seconds * self.scale
+
+    def _build_index(self) -> None:
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                key, _, _ = line.partition(b"\t")
+                self._index.setdefault(key.decode("ascii"), []).append(offset)
+                offset += len(line)
+
+    def _next(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            offsets = self._index.get(key)
+            if not offsets:
+                return None
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+            offset = offsets[min(cursor, len(offsets) - 1)]
+
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            _, _, payload = f.readline().partition(b"\t")
+        return json.loads(payload)
+
+    def __repr__(self) -> str:
+        return f"ReplayClient(path={self.path}, scale={self.scale})"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+def _latency_scale(latency: Latency) -> float:
+    if latency == "original":
+        return 1.0
+    if latency == "zero":
+        return 0.0
+    scale = float(latency)
+    if scale < 0:
+        raise ValueError(f"Latency scale must not be negative: {latency}")
+    return scale
@@ -0,0 +1,160 @@
+"""
+Compact GenAI response for workloads that retain many results
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, IO, Iterable, Iterator, Optional
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency, only needed for msgpack serialization
+    msgpack = None
+
+
+class CompactGenAIResponse:
+    """
+    Slotted response holding only content, finish reason, usage and timing.
+
+    A full provider response object weighs several kilobytes; this keeps a
+    few hundred bytes plus the content. The raw payload is dropped unless
+    explicitly kept with keep_raw=True.
+    """
+
+    __slots__ = (
+        "content",
+        "finish_reason",
+        "model",
+        "prompt_tokens",
+        "completion_tokens",
+        "total_tokens",
+        "elapsed",
+        "error",
+        "raw",
+    )
+
+    FIELDS = __slots__[:-1]
+
+    def __init__(
+        self,
+        content: Optional[str] = None,
+        finish_reason: Optional[str] = None,
+        model: Optional[str] = None,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+        total_tokens: Optional[int] = None,
+        elapsed: Optional[float] = None,
+        error: Optional[str] = None,
+        raw: Any = None,
+    ):
+        self.content = content
+        self.finish_reason = finish_reason
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = total_tokens
+        self.elapsed = elapsed
+        self.error = error
+        self.raw = raw
+
+    @classmethod
+    def from_response(
+        cls, response: Any, elapsed: Optional[float] = None, keep_raw: bool = False
+    ) -> CompactGenAIResponse:
+        """
+        Extract the compact fields from a raw chat completion response.
+
+        Args:
+            response: Raw provider response (OpenAI chat completion shape)
+            elapsed: Request duration in seconds
+            keep_raw: Keep a reference to the raw response
+
+        Returns:
+            CompactGenAIResponse object
+        """
+        error = getattr(response, "error", None)
+        if error and "message" in error:
+            return cls(error=error["message"], elapsed=elapsed, raw=response if keep_raw else None)
+
+        choice = response.choices[0] if getattr(response, "choices", None) else None
+        content = choice.message.content if choice is not None else None
+        usage = getattr(response, "usage", None)
+
+        return cls(
+            content=content.strip() if content else content,
+            finish_reason=getattr(choice, "finish_reason", None),
+            model=getattr(response, "model", None),
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+            total_tokens=getattr(usage, "total_tokens", None),
+            elapsed=elapsed,
+            raw=response if keep_raw else None,
+        )
+
+    @classmethod
+    def from_exception(
+        cls, ex: Exception, elapsed: Optional[float] = None
+    ) -> CompactGenAIResponse:
+        return cls(error=f"{str(ex)}", elapsed=elapsed)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> CompactGenAIResponse:
+        return cls(**{key: data.get(key) for key in cls.FIELDS})
+
+    @classmethod
+    def from_msgpack(cls, payload: bytes) -> CompactGenAIResponse:
+        _require_msgpack()
+        return cls(*msgpack.unpackb(payload))
+
+    def failure(self) -> bool:
+        return self.error is not None
+
+    def unwrap(self) -> str:
+        return self.error or self.content or ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+    def to_msgpack(self) -> bytes:
+        # Positional array: smaller than a map and field order is fixed by FIELDS
+        _require_msgpack()
+        return msgpack.packb([getattr(self, key) for key in self.FIELDS])
+
+    def __repr__(self) -> str:
+        return (
+            f"CompactGenAIResponse(finish_reason={self.finish_reason}, "
+            f"total_tokens={self.total_tokens}, elapsed={self.elapsed}, error={self.error})"
+        )
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+def dump_jsonl(responses: Iterable[CompactGenAIResponse], fp: IO[str]) -> int:
+    """
+    Write responses to a text stream, one JSON object per line.
+
+    Returns:
+        Number of responses written
+    """
+    count = 0
+    for response in responses:
+        fp.write(response.to_json())
+        fp.write("\n")
+        count += 1
+    return count
+
+
+def load_jsonl(fp: IO[str]) -> Iterator[CompactGenAIResponse]:
+    """Read responses written by dump_jsonl, one at a time."""
+    for line in fp:
+        if line.strip():
+            yield CompactGenAIResponse.from_dict(json.loads(line))
+
+
+def _require_msgpack() -> None:
+    if msgpack is None:
+        raise ImportError("msgpack is required for msgpack serialization: pip install msgpack")
@@ -0,0 +1,350 @@
+"""
+Token-bounded multi-turn conversations.
+
+Older turns are folded into a running summary in the background, through the
+async client, so the prompt sent on each turn stays roughly the same size no
+matter how long the conversation gets.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, Iterator, List, Optional
+
+from .cancellation import CancellationToken
+from .genai_interface import GenAIResponseProtocol, GenAIServiceInterface
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below so it can replace the original turns as "
+    "context for the rest of the conversation. Keep facts, decisions, names, "
+    "open questions and user preferences. Be concise."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+class Turn:
+    __slots__ = ("role", "content", "tokens")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+        # Per-message overhead for role and separators
+        self.tokens = estimate_tokens(content) + 4
+
+    def to_message(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+    def __repr__(self) -> str:
+        return f"Turn(role={self.role}, tokens={self.tokens})"
+
+
+class Conversation:
+    """
+    A single conversation: an optional system context, a summary of older
+    turns, and the most recent turns verbatim.
+    """
+
+    def __init__(
+        self,
+        service: GenAIServiceInterface,
+        context: Optional[str] = None,
+        max_tokens: int = 3000,
+        keep_recent: int = 4,
+        summary_model: Optional[str] = None,
+    ):
+        """
+        Initialize a conversation.
+
+        Args:
+            service: Service used for chat and background summarization
+            context: Optional system context sent with every turn
+            max_tokens: Token budget for the history sent on each turn
+            keep_recent: Number of most recent turns never folded into the summary
+            summary_model: Optional model override for summarization
+        """
+        self.service = service
+        self.context = context
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.summary_model = summary_model
+
+        self.summary: str = ""
+        self.turns: List[Turn] = []
+
+        self._lock = threading.Lock()
+        self._compaction: Optional[Future] = None
+
+    def build_messages(self, prompt: str) -> List[Dict[str, str]]:
+        """
+        Build the messages for the next turn.
+
+        The most recent turns that fit in the token budget are sent verbatim,
+        so the prompt stays bounded even while a compaction is still running.
+
+        Args:
+            prompt: The new user prompt
+
+        Returns:
+            Messages ready for GenAIService.process_messages
+        """
+        with self._lock:
+            messages = []
+            if self.context:
+                messages.append({"role": "developer", "content": self.context})
+            if self.summary:
+                messages.append(
+                    {
+                        "role": "developer",
+                        "content": f"Summary of the earlier conversation:\n{self.summary}",
+                    }
+                )
+
+            budget = self.max_tokens - estimate_tokens(self.summary)
+            recent: List[Turn] = []
+            for turn in reversed(self.turns):
+                budget -= turn.tokens
+                if budget < 0 and recent:
+                    break
+                recent.append(turn)
+
+            messages.extend(turn.to_message() for turn in reversed(recent))
+            messages.append({"role": "user", "content": prompt})
+            return messages
+
+    def send(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0,
+        timeout: Optional[float] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> GenAIResponseProtocol:
+        """
+        Send a user prompt, record the exchange and compact if needed.
+
+        Args:
+            prompt: The user prompt
+            model: Optional model override
+            temperature: Temperature setting for response generation
+            timeout: Optional deadline for the request, in seconds
+            cancel_token: Optional token to cancel the request
+
+        Returns:
+            The response for this turn
+        """
+        response = self.service.process_messages(
+            self.build_messages(prompt), model, temperature,
+            timeout=timeout, cancel_token=cancel_token,
+        )
+        if not response.failure():
+            self.append("user", prompt)
+            self.append("assistant", response.unwrap())
+        return response
+
+    def stream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0,
+        timeout: Optional[float] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> Iterator[str]:
+        """
+        Stream the reply to a user prompt as text deltas. The exchange is
+        recorded only if the stream completes.
+
+        Args:
+            prompt: The user prompt
+            model: Optional model override
+            temperature: Temperature setting for response generation
+            timeout: Optional deadline for the whole stream, in seconds
+            cancel_token: Optional token to cancel the stream
+
+        Returns:
+            Iterator of text deltas
+        """
+        deltas = []
+        for delta in self.service.stream_messages(
+            self.build_messages(prompt), model, temperature,
+            timeout=timeout, cancel_token=cancel_token,
+        ):
+            deltas.append(delta)
+            yield delta
+
+        self.append("user", prompt)
+        self.append("assistant", "".join(deltas).strip())
+
+    def append(self, role: str, content: str) -> None:
+        """Record a turn and schedule a compaction if the history is over budget."""
+        with self._lock:
+            self.turns.append(Turn(role, content))
+        self.maybe_compact()
+
+    def history_tokens(self) -> int:
+        """Estimated tokens for the summary plus all unsummarized turns."""
+        with self._lock:
+            return estimate_tokens(self.summary) + sum(t.tokens for t in self.turns)
+
+    def maybe_compact(self) -> bool:
+        """
+        Start a background compaction if the history exceeds the token budget
+        and none is already running.
+
+        Returns:
+            True if a compaction was scheduled
+        """
+        with self._lock:
+            if self._compaction is not None and not self._compaction.done():
+                return False
+
+            count = len(self.turns) - self.keep_recent
+            total = estimate_tokens(self.summary) + sum(t.tokens for t in self.turns)
+            if count <= 0 or total <= self.max_tokens:
+                return False
+
+            prompt = self._summary_prompt(self.turns[:count])
+            compaction = _submit(
+                self.service.process_single_prompt_async(
+                    prompt, SUMMARY_PROMPT, self.summary_model
+                )
+            )
+            self._compaction = compaction
+
+        # Outside the lock: the callback runs inline if the future is already done
+        compaction.add_done_callback(lambda future: self._apply_summary(future, count))
+        return True
+
+    def wait_for_compaction(self, timeout: Optional[float] = None) -> None:
+        """Block until a running compaction finishes. Mostly useful in tests."""
+        future = self._compaction
+        if future is not None:
+            future.result(timeout)
+
+    def to_state(self) -> Dict[str, Any]:
+        """Compact, serializable state of the conversation."""
+        with self._lock:
+            return {
+                "context": self.context,
+                "summary": self.summary,
+                "turns": [[turn.role, turn.content] for turn in self.turns],
+            }
+
+    def load_state(self, state: Dict[str, Any]) -> Conversation:
+        """Restore state produced by to_state."""
+        with self._lock:
+            self.context = state.get("context")
+            self.summary = state.get("summary", "")
+            self.turns = [Turn(role, content) for role, content in state.get("turns", [])]
+        return self
+
+    def _summary_prompt(self, turns: List[Turn]) -> str:
+        lines = []
+        if self.summary:
+            lines.append(f"Earlier summary:\n{self.summary}\n")
+        lines.extend(f"{turn.role}: {turn.content}" for turn in turns)
+        return "\n".join(lines)
+
+    def _apply_summary(self, future: Future, count: int) -> None:
+        try:
+            response = future.result()
+        except Exception as e:
+            logger.error(f"Conversation compaction failed: {e}")
+            return
+
+        if response.failure():
+            logger.error(f"Conversation compaction failed: {response.unwrap()}")
+            return
+
+        # Turns are only ever appended, so the first `count` turns are exactly
+        # the ones that were summarized even if new turns arrived meanwhile
+        with self._lock:
+            self.summary = response.unwrap()
+            self.turns = self.turns[count:]
+
+    def __repr__(self) -> str:
+        return f"Conversation(turns={len(self.turns)}, summary={bool(self.summary)})"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+class ConversationStore:
+    """
+    Thread-safe, size-bounded collection of conversations keyed by id.
+    The least recently used conversation is dropped when the store is full.
+    """
+
+    def __init__(self, service: GenAIServiceInterface, max_conversations: int = 256, **defaults):
+        """
+        Initialize the store.
+
+        Args:
+            service: Service handed to every new conversation
+            max_conversations: Maximum number of conversations kept in memory
+            **defaults: Default keyword arguments for new Conversation objects
+        """
+        self.service = service
+        self.max_conversations = max_conversations
+        self.defaults = defaults
+        self._conversations: OrderedDict[str, Conversation] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: Optional[str] = None, **kwargs) -> Conversation:
+        """
+        Get a conversation, creating it if needed.
+
+        Args:
+            conversation_id: Conversation identifier; a new id is used if None
+            **kwargs: Overrides for the store defaults when creating
+
+        Returns:
+            The conversation
+        """
+        conversation_id = conversation_id or uuid.uuid4().hex
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is None:
+                conversation = Conversation(self.service, **{**self.defaults, **kwargs})
+                self._conversations[conversation_id] = conversation
+                while len(self._conversations) > self.max_conversations:
+                    self._conversations.popitem(last=False)
+            else:
+                self._conversations.move_to_end(conversation_id)
+            return conversation
+
+    def drop(self, conversation_id: str) -> None:
+        """Forget a conversation."""
+        with self._lock:
+            self._conversations.pop(conversation_id, None)
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+
+# Background event loop shared by all conversations for async summarization
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _submit(coroutine) -> Future:
+    global _loop
+
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="genai-background", daemon=True
+            ).start()
+
+    return asyncio.run_coroutine_threadsafe(coroutine, _loop)
@@ -2,7 +2,8 @@
 Generic interfaces for GenAI clients and services
 """
 from abc import ABC, abstractmethod
-from typing import Optional, List, Dict, Any, Protocol, runtime_checkable
+from typing import Optional, List, Dict, Any, Iterator, AsyncIterator, Protocol, runtime_checkable
+from .cancellation import CancellationToken
 
 
 @runtime_checkable
@@ -25,24 +26,69 @@ class GenAIClientProtocol(Protocol):
     base_url: str
     model: str
     
-    def get_active_model_names(self) -> List[str]:
+    def get_active_model_names(self, timeout: Optional[float] = None) -> List[str]:
         """Get a list of active model names"""
         ...
+
+    def embed(
+        self, texts: List[str], model: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> List[List[float]]:
+        """Get one embedding vector per text"""
+        ...
         
     def completion(
         self, prompt: str, context: Optional[str] = None, 
-        model: Optional[str] = None, temperature: float = 0
+        model: Optional[str] = None, temperature: float = 0,
+        timeout: Optional[float] = None
     ) -> GenAIResponseProtocol:
         """Process a completion request synchronously"""
         ...
         
     async def async_completion(
         self, prompt: str, context: Optional[str] = None, 
-        model: Optional[str] = None, temperature: float = 0
+        model: Optional[str] = None, temperature: float = 0,
+        timeout: Optional[float] = None
     ) -> GenAIResponseProtocol:
         """Process a completion request asynchronously"""
         ...
 
+    def chat(
+        self, messages: List[Dict[str, str]],
+        model: Optional[str] = None, temperature: float = 0,
+        response_format: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> GenAIResponseProtocol:
+        """Process a multi-turn chat request synchronously"""
+        ...
+
+    async def async_chat(
+        self, messages: List[Dict[str, str]],
+        model: Optional[str] = None, temperature: float = 0,
+        response_format: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> GenAIResponseProtocol:
+        """Process a multi-turn chat request asynchronously"""
+        ...
+
+    def stream_chat(
+        self, messages: List[Dict[str, str]],
+        model: Optional[str] = None, temperature: float = 0,
+        response_format: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> Iterator[str]:
+        """Stream the content of a multi-turn chat response as text deltas"""
+        ...
+
+    def async_stream_chat(
+        self, messages: List[Dict[str, str]],
+        model: Optional[str] = None, temperature: float = 0,
+        response_format: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """Stream the content of a multi-turn chat response asynchronously"""
+        ...
+
 
 class GenAIServiceInterface(ABC):
     """Base interface for GenAI services"""
@@ -58,14 +104,15 @@ class GenAIServiceInterface(ABC):
         pass
         
     @abstractmethod
-    def get_active_model_names(self) -> List[str]:
+    def get_active_model_names(self, timeout: Optional[float] = None) -> List[str]:
         """Get a list of active model names"""
         pass
         
     @abstractmethod
     def process_single_prompt(
         self, content: str, context: Optional[str] = None,
-        model: Optional[str] = None, temperature: float = 0
+        model: Optional[str] = None, temperature: float = 0,
+        timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None
     ) -> GenAIResponseProtocol:
         """Process a single prompt synchronously"""
         pass
@@ -73,8 +120,27 @@ class GenAIServiceInterface(ABC):
     @abstractmethod
     async def process_single_prompt_async(
         self, content: str, context: Optional[str] = None,
-        model: Optional[str] = None, temperature: float = 0
+        model: Optional[str] = None, temperature: float = 0,
+        timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None
     ) -> GenAIResponseProtocol:
         """Process a single prompt asynchronously"""
         pass
+
+    @abstractmethod
+    def process_messages(
+        self, messages: List[Dict[str, str]],
+        model: Optional[str] = None, temperature: float = 0,
+        timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None
+    ) -> GenAIResponseProtocol:
+        """Process a multi-turn conversation synchronously"""
+        pass
+
+    @abstractmethod
+    async def process_messages_async(
+        self, messages: List[Dict[str, str]],
+        model: Optional[str] = None, temperature: float = 0,
+        timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None
+    ) -> GenAIResponseProtocol:
+        """Process a multi-turn conversation asynchronously"""
+        pass
     
\ No newline at end of file
@@ -1,8 +1,25 @@
 """
 Implementation of a generic GenAI service
 """
-from typing import Optional, List
+import asyncio
+import json
+import logging
+from typing import Optional, List, Dict, Any, Callable, Iterator, AsyncIterator, Tuple
+from .cancellation import CancellationToken, RequestCancelled, combine
+from .compact_response import CompactGenAIResponse
 from .genai_interface import GenAIClientProtocol, GenAIResponseProtocol, GenAIServiceInterface
+from .structured import (
+    IncrementalJSONParser,
+    Path,
+    SchemaError,
+    StructuredResult,
+    format_path,
+    validate,
+)
+
+logger = logging.getLogger(__name__)
+
+FieldCallback = Callable[[Path, Any], None]
 
 
 class GenAIService(GenAIServiceInterface):
@@ -23,42 +40,568 @@ class GenAIService(GenAIServiceInterface):
         """Get the default model used by the client."""
         return self.client.model
 
-    def get_active_model_names(self) -> List[str]:
-        """Get a list of active model names."""
-        return self.client.get_active_model_names()
+    def get_active_model_names(self, timeout: Optional[float] = None) -> List[str]:
+        """
+        Get a list of active model names.
+
+        Args:
+            timeout: Optional request timeout in seconds; the request is not
+                retried when it is set
+        """
+        return self.client.get_active_model_names(timeout=timeout)
+
+    def get_embeddings(
+        self, texts: List[str], model: Optional[str] = None,
+        timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None
+    ) -> List[List[float]]:
+        """
+        Get one embedding vector per text.
+        
+        Args:
+            texts: The texts to embed
+            model: Optional embedding model override
+            timeout: Optional deadline for the request, in seconds
+            cancel_token: Optional token to cancel the request
+            
+        Returns:
+            List of embedding vectors, in the order of `texts`
+
+        Raises:
+            RequestCancelled: If the request was cancelled or ran past its deadline
+        """
+        token = combine(timeout, cancel_token)
+        try:
+            if token is not None:
+                token.raise_if_cancelled()
+            embeddings = self.client.embed(texts, model, timeout=_remaining(token))
+            if token is not None:
+                token.raise_if_cancelled()
+            return embeddings
+        finally:
+            _release(token)
 
     def process_single_prompt(
-        self, content: str, context: Optional[str] = None, model: Optional[str] = None, temperature: float = 0
+        self, content: str, context: Optional[str] = None, model: Optional[str] = None, temperature: float = 0,
+        timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None
     ) -> GenAIResponseProtocol:
         """
         Process a single prompt synchronously.
+
+        A synchronous request cannot be interrupted mid-flight: the deadline is
+        passed to the client as the request timeout, and a request cancelled
+        while running returns a cancelled response instead of its result.
+        Use the async or streaming variants to abort requests immediately.
         
         Args:
             content: The prompt content
             context: Optional context for the prompt
             model: Optional model override
             temperature: Temperature setting for response generation
+            timeout: Optional deadline for the request, in seconds
+            cancel_token: Optional token to cancel the request
             
         Returns:
             GenAIResponse object
         """
-        return self.client.completion(content, context, model, temperature)
+        return self._call(
+            combine(timeout, cancel_token),
+            lambda remaining: self.client.completion(content, context, model, temperature, timeout=remaining),
+        )
 
     async def process_single_prompt_async(
-        self, content: str, context: Optional[str] = None, model: Optional[str] = None, temperature: float = 0
+        self, content: str, context: Optional[str] = None, model: Optional[str] = None, temperature: float = 0,
+        timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None
     ) -> GenAIResponseProtocol:
         """
         Process a single prompt asynchronously.
+
+        Cancelling the token, or reaching the deadline, cancels the in-flight
+        request and releases its connection.
         
         Args:
             content: The prompt content
             context: Optional context for the prompt
             model: Optional model override
             temperature: Temperature setting for response generation
+            timeout: Optional deadline for the request, in seconds
+            cancel_token: Optional token to cancel the request
             
         Returns:
             GenAIResponse object
         """
-        return await self.client.async_completion(content, context, model, temperature)
-    
-    
\ No newline at end of file
+        return await self._call_async(
+            combine(timeout, cancel_token),
+            lambda remaining: self.client.async_completion(content, context, model, temperature, timeout=remaining),
+        )
+
+    def process_messages(
+        self, messages: List[Dict[str, str]], model: Optional[str] = None, temperature: float = 0,
+        timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None
+    ) -> GenAIResponseProtocol:
+        """
+        Process a multi-turn conversation synchronously.
+        Cancellation behaves as in process_single_prompt.
+        
+        Args:
+            messages: Chat messages as dictionaries with "role" and "content"
+            model: Optional model override
+            temperature: Temperature setting for response generation
+            timeout: Optional deadline for the request, in seconds
+            cancel_token: Optional token to cancel the request
+            
+        Returns:
+            GenAIResponse object
+        """
+        return self._call(
+            combine(timeout, cancel_token),
+            lambda remaining: self.client.chat(messages, model, temperature, timeout=remaining),
+        )
+
+    async def process_messages_async(
+        self, messages: List[Dict[str, str]], model: Optional[str] = None, temperature: float = 0,
+        timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None
+    ) -> GenAIResponseProtocol:
+        """
+        Process a multi-turn conversation asynchronously.
+        Cancellation behaves as in process_single_prompt_async.
+        
+        Args:
+            messages: Chat messages as dictionaries with "role" and "content"
+            model: Optional model override
+            temperature: Temperature setting for response generation
+            timeout: Optional deadline for the request, in seconds
+            cancel_token: Optional token to cancel the request
+            
+        Returns:
+            GenAIResponse object
+        """
+        return await self._call_async(
+            combine(timeout, cancel_token),
+            lambda remaining: self.client.async_chat(messages, model, temperature, timeout=remaining),
+        )
+
+    def stream_messages(
+        self, messages: List[Dict[str, str]], model: Optional[str] = None, temperature: float = 0,
+        timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None
+    ) -> Iterator[str]:
+        """
+        Stream the response to a multi-turn conversation as text deltas.
+
+        The token and deadline are checked between chunks; when either fires
+        the stream is closed, releasing its connection, and RequestCancelled
+        is raised.
+        
+        Args:
+            messages: Chat messages as dictionaries with "role" and "content"
+            model: Optional model override
+            temperature: Temperature setting for response generation
+            timeout: Optional deadline for the whole stream, in seconds
+            cancel_token: Optional token to cancel the stream
+            
+        Returns:
+            Iterator of text deltas
+        """
+        token = combine(timeout, cancel_token)
+        return self._stream(
+            token,
+            self.client.stream_chat(messages, model, temperature, timeout=_remaining(token)),
+        )
+
+    def stream_messages_async(
+        self, messages: List[Dict[str, str]], model: Optional[str] = None, temperature: float = 0,
+        timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None
+    ) -> AsyncIterator[str]:
+        """
+        Asynchronous variant of stream_messages. Cancellation also interrupts
+        a pending read instead of waiting for the next chunk.
+        """
+        token = combine(timeout, cancel_token)
+        return self._stream_async(
+            token,
+            self.client.async_stream_chat(messages, model, temperature, timeout=_remaining(token)),
+        )
+
+    def stream_structured(
+        self, content: str, schema: Dict[str, Any], context: Optional[str] = None,
+        model: Optional[str] = None, temperature: float = 0,
+        name: str = "result", mode: str = "json_schema",
+        timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None
+    ) -> Iterator[Tuple[Path, Any]]:
+        """
+        Request a JSON object matching a schema and stream it as it is parsed.
+
+        Each top-level field, and each element of top-level array fields, is
+        yielded as a (path, value) tuple as soon as it is complete. The last
+        tuple has an empty path and holds the whole document.
+        Cancellation behaves as in stream_messages.
+        
+        Args:
+            content: The prompt content
+            schema: JSON schema of the expected object
+            context: Optional context for the prompt
+            model: Optional model override
+            temperature: Temperature setting for response generation
+            name: Name of the schema, sent to the provider
+            mode: "json_schema" to enforce the schema, or "json_object" for
+                providers that only support JSON mode
+            timeout: Optional deadline for the whole stream, in seconds
+            cancel_token: Optional token to cancel the stream
+            
+        Returns:
+            Iterator of (path, value) tuples
+        """
+        messages, response_format = _structured_request(content, schema, context, name, mode)
+        token = combine(timeout, cancel_token)
+        parser = IncrementalJSONParser()
+        deltas = self.client.stream_chat(
+            messages, model, temperature, response_format, timeout=_remaining(token)
+        )
+        for delta in self._stream(token, deltas):
+            yield from parser.feed(delta)
+        yield (), parser.close()
+
+    async def stream_structured_async(
+        self, content: str, schema: Dict[str, Any], context: Optional[str] = None,
+        model: Optional[str] = None, temperature: float = 0,
+        name: str = "result", mode: str = "json_schema",
+        timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None
+    ) -> AsyncIterator[Tuple[Path, Any]]:
+        """
+        Asynchronous variant of stream_structured.
+        """
+        messages, response_format = _structured_request(content, schema, context, name, mode)
+        token = combine(timeout, cancel_token)
+        parser = IncrementalJSONParser()
+        deltas = self.client.async_stream_chat(
+            messages, model, temperature, response_format, timeout=_remaining(token)
+        )
+        async for delta in self._stream_async(token, deltas):
+            for event in parser.feed(delta):
+                yield event
+        yield (), parser.close()
+
+    def process_structured(
+        self, content: str, schema: Dict[str, Any], context: Optional[str] = None,
+        model: Optional[str] = None, temperature: float = 0,
+        name: str = "result", mode: str = "json_schema",
+        max_retries: int = 2, on_field: Optional[FieldCallback] = None,
+        timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None
+    ) -> StructuredResult:
+        """
+        Request a JSON object matching a schema, validate it and repair it.
+
+        Only what fails is retried: invalid elements of top-level array fields
+        are re-requested one by one, while any other error retries the whole
+        document. Cancellation stops all retries.
+        
+        Args:
+            content: The prompt content
+            schema: JSON schema of the expected object
+            context: Optional context for the prompt
+            model: Optional model override
+            temperature: Temperature setting for response generation
+            name: Name of the schema, sent to the provider
+            mode: "json_schema" or "json_object", see stream_structured
+            max_retries: Maximum number of retries for the document and for each item
+            on_field: Optional callback receiving (path, value) for each field as it streams in
+            timeout: Optional deadline covering all requests and retries, in seconds
+            cancel_token: Optional token to cancel the request and its retries
+            
+        Returns:
+            StructuredResult object
+        """
+        token = combine(timeout, cancel_token)
+        requests = 0
+        prompt = content
+        value, errors = None, []
+
+        try:
+            for _ in range(max_retries + 1):
+                requests += 1
+                try:
+                    value = None
+                    for path, item in self.stream_structured(
+                        prompt, schema, context, model, temperature, name, mode, cancel_token=token
+                    ):
+                        if not path:
+                            value = item
+                        elif on_field:
+                            on_field(path, item)
+                except RequestCancelled as e:
+                    return StructuredResult(None, [((), f"{e}")], requests)
+                except Exception as e:
+                    logger.error(f"Structured output request failed: {e}")
+                    errors = [((), f"{e}")]
+                    continue
+
+                errors = validate(value, schema)
+                item_errors, document_errors = _split_errors(errors, schema)
+                if document_errors:
+                    prompt = _retry_prompt(content, document_errors)
+                    continue
+
+                errors = []
+                for (key, index), failures in item_errors.items():
+                    item, failures, count = self._repair_item(
+                        content, schema, key, index, value[key][index], failures,
+                        context, model, temperature, name, mode, max_retries, token
+                    )
+                    value[key][index] = item
+                    errors.extend(failures)
+                    requests += count
+                break
+        finally:
+            _release(token)
+
+        return StructuredResult(value, errors, requests)
+
+    async def process_structured_async(
+        self, content: str, schema: Dict[str, Any], context: Optional[str] = None,
+        model: Optional[str] = None, temperature: float = 0,
+        name: str = "result", mode: str = "json_schema",
+        max_retries: int = 2, on_field: Optional[FieldCallback] = None,
+        timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None
+    ) -> StructuredResult:
+        """
+        Asynchronous variant of process_structured. Failing items are repaired concurrently.
+        """
+        token = combine(timeout, cancel_token)
+        requests = 0
+        prompt = content
+        value, errors = None, []
+
+        try:
+            for _ in range(max_retries + 1):
+                requests += 1
+                try:
+                    value = None
+                    async for path, item in self.stream_structured_async(
+                        prompt, schema, context, model, temperature, name, mode, cancel_token=token
+                    ):
+                        if not path:
+                            value = item
+                        elif on_field:
+                            on_field(path, item)
+                except RequestCancelled as e:
+                    return StructuredResult(None, [((), f"{e}")], requests)
+                except Exception as e:
+                    logger.error(f"Structured output request failed: {e}")
+                    errors = [((), f"{e}")]
+                    continue
+
+                errors = validate(value, schema)
+                item_errors, document_errors = _split_errors(errors, schema)
+                if document_errors:
+                    prompt = _retry_prompt(content, document_errors)
+                    continue
+
+                repairs = await asyncio.gather(*(
+                    self._repair_item_async(
+                        content, schema, key, index, value[key][index], failures,
+                        context, model, temperature, name, mode, max_retries, token
+                    )
+                    for (key, index), failures in item_errors.items()
+                ))
+                errors = []
+                for (key, index), (item, failures, count) in zip(item_errors, repairs):
+                    value[key][index] = item
+                    errors.extend(failures)
+                    requests += count
+                break
+        finally:
+            _release(token)
+
+        return StructuredResult(value, errors, requests)
+
+    def _repair_item(
+        self, content, schema, key, index, item, errors,
+        context, model, temperature, name, mode, max_retries, token
+    ):
+        item_schema = _item_wrapper(schema, key)
+        requests = 0
+        for _ in range(max_retries):
+            result = self.process_structured(
+                _repair_prompt(content, key, index, item, errors), item_schema,
+                context, model, temperature, f"{name}_item", mode, max_retries=0, cancel_token=token
+            )
+            requests += result.requests
+            if not result.failure():
+                return result.value["item"], [], requests
+            errors = _rebase(result.errors, (key, index))
+        return item, errors, requests
+
+    async def _repair_item_async(
+        self, content, schema, key, index, item, errors,
+        context, model, temperature, name, mode, max_retries, token
+    ):
+        item_schema = _item_wrapper(schema, key)
+        requests = 0
+        for _ in range(max_retries):
+            result = await self.process_structured_async(
+                _repair_prompt(content, key, index, item, errors), item_schema,
+                context, model, temperature, f"{name}_item", mode, max_retries=0, cancel_token=token
+            )
+            requests += result.requests
+            if not result.failure():
+                return result.value["item"], [], requests
+            errors = _rebase(result.errors, (key, index))
+        return item, errors, requests
+
+    def _call(self, token: Optional[CancellationToken], call):
+        # `call` receives the remaining time, to be used as the request timeout
+        if token is None:
+            return call(None)
+        try:
+            if token.cancelled:
+                return _cancelled_response(token)
+            response = call(token.remaining())
+            # The result of a request cancelled while running is discarded
+            return _cancelled_response(token) if token.cancelled else response
+        finally:
+            token.release()
+
+    async def _call_async(self, token: Optional[CancellationToken], call):
+        if token is None:
+            return await call(None)
+        try:
+            return await _await_cancellable(token, call(token.remaining()))
+        except RequestCancelled:
+            return _cancelled_response(token)
+        finally:
+            token.release()
+
+    def _stream(self, token: Optional[CancellationToken], deltas: Iterator[str]) -> Iterator[str]:
+        try:
+            for delta in deltas:
+                if token is not None:
+                    token.raise_if_cancelled()
+                yield delta
+        finally:
+            # Closing the client generator closes the underlying HTTP stream
+            deltas.close()
+            _release(token)
+
+    async def _stream_async(
+        self, token: Optional[CancellationToken], deltas: AsyncIterator[str]
+    ) -> AsyncIterator[str]:
+        try:
+            while True:
+                try:
+                    delta = await _await_cancellable(token, deltas.__anext__())
+                except StopAsyncIteration:
+                    break
+                yield delta
+        finally:
+            await deltas.aclose()
+            _release(token)
+
+
+async def _await_cancellable(token: Optional[CancellationToken], awaitable):
+    """
+    Await `awaitable`, cancelling it when the token is cancelled or its
+    deadline passes. Raises RequestCancelled in both cases.
+    """
+    if token is None:
+        return await awaitable
+
+    task = asyncio.ensure_future(awaitable)
+    if token.cancelled:
+        task.cancel()
+        raise token.error()
+
+    # Tokens may be cancelled from any thread, e.g. by the Streamlit launcher
+    loop = asyncio.get_running_loop()
+    remove = token.add_callback(lambda: loop.call_soon_threadsafe(task.cancel))
+    try:
+        return await asyncio.wait_for(task, token.remaining())
+    except asyncio.TimeoutError:
+        token.cancel("deadline exceeded")
+        raise token.error()
+    except asyncio.CancelledError:
+        if token.cancelled:
+            raise token.error()
+        raise
+    finally:
+        remove()
+
+
+def _cancelled_response(token: CancellationToken) -> CompactGenAIResponse:
+    return CompactGenAIResponse.from_exception(token.error())
+
+
+def _remaining(token: Optional[CancellationToken]) -> Optional[float]:
+    return token.remaining() if token is not None else None
+
+
+def _release(token: Optional[CancellationToken]) -> None:
+    if token is not None:
+        token.release()
+
+
+def _structured_request(
+    content: str, schema: Dict[str, Any], context: Optional[str], name: str, mode: str
+) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+    instructions = (
+        "Respond only with a JSON object matching this JSON schema:\n"
+        f"{json.dumps(schema)}"
+    )
+    messages = [{"role": "developer", "content": f"{context}\n\n{instructions}" if context else instructions}]
+    messages.append({"role": "user", "content": content})
+
+    if mode == "json_schema":
+        response_format = {"type": "json_schema", "json_schema": {"name": name, "schema": schema}}
+    elif mode == "json_object":
+        response_format = {"type": "json_object"}
+    else:
+        raise ValueError(f"Unsupported structured output mode: {mode}")
+
+    return messages, response_format
+
+
+def _split_errors(
+    errors: List[SchemaError], schema: Dict[str, Any]
+) -> Tuple[Dict[Tuple[str, int], List[SchemaError]], List[SchemaError]]:
+    # Errors inside an element of a top-level array field can be repaired on
+    # their own; everything else needs the whole document again
+    items: Dict[Tuple[str, int], List[SchemaError]] = {}
+    document: List[SchemaError] = []
+    properties = schema.get("properties", {})
+    for path, message in errors:
+        if len(path) >= 2 and isinstance(path[1], int) and "items" in properties.get(path[0], {}):
+            items.setdefault((path[0], path[1]), []).append((path, message))
+        else:
+            document.append((path, message))
+    return items, document
+
+
+def _item_wrapper(schema: Dict[str, Any], key: str) -> Dict[str, Any]:
+    # Providers expect an object at the root, so wrap the item schema
+    return {
+        "type": "object",
+        "properties": {"item": schema["properties"][key]["items"]},
+        "required": ["item"],
+    }
+
+
+def _rebase(errors: List[SchemaError], prefix: Path) -> List[SchemaError]:
+    # Map errors from the {"item": ...} wrapper back onto the original document
+    return [(prefix + path[1:], message) for path, message in errors]
+
+
+def _format_errors(errors: List[SchemaError]) -> str:
+    return "\n".join(f"- {format_path(path)}: {message}" for path, message in errors)
+
+
+def _retry_prompt(content: str, errors: List[SchemaError]) -> str:
+    return (
+        f"{content}\n\nYour previous answer did not match the schema:\n"
+        f"{_format_errors(errors)}"
+    )
+
+
+def _repair_prompt(content: str, key: str, index: int, item: Any, errors: List[SchemaError]) -> str:
+    return (
+        f"{content}\n\nIn your previous answer, the entry at {format_path((key, index))} "
+        f"was invalid:\n{json.dumps(item)}\n{_format_errors(errors)}\n"
+        'Return only the corrected entry, as {"item": <entry>}.'
+    )
@@ -4,9 +4,11 @@ OpenAI implementation of GenAI client
 
 from __future__ import annotations
 import logging
+import time
 
 import openai
-from typing import Optional, List, Dict, Any, Type
+from typing import Optional, List, Dict, Any, Type, Iterator, AsyncIterator, Union
+from .compact_response import CompactGenAIResponse
 from .genai_service import GenAIService
 
 logger = logging.getLogger(__name__)
@@ -14,16 +16,23 @@ logger = logging.getLogger(__name__)
 
 class GenAIResponse:
     @classmethod
-    def from_response(cls, response: Any) -> GenAIResponse:
-        return cls(response, exception=None)
+    def from_response(cls, response: Any, elapsed: Optional[float] = None) -> GenAIResponse:
+        return cls(response, exception=None, elapsed=elapsed)
 
     @classmethod
-    def from_exception(cls, ex: Exception) -> GenAIResponse:
-        return cls(response=None, exception=ex)
+    def from_exception(cls, ex: Exception, elapsed: Optional[float] = None) -> GenAIResponse:
+        return cls(response=None, exception=ex, elapsed=elapsed)
 
-    def __init__(self, response: Any, exception: Optional[Exception] = None):
+    def __init__(
+        self,
+        response: Any,
+        exception: Optional[Exception] = None,
+        elapsed: Optional[float] = None,
+    ):
         self.error: Optional[str] = None
         self.response = None
+        self.elapsed = elapsed
+        self._compact: Optional[CompactGenAIResponse] = None
 
         if exception:
             self.error = f"{str(exception)}"
@@ -42,6 +51,25 @@ class GenAIResponse:
     def unwrap(self) -> str:
         return self.error or self.response.choices[0].message.content.strip()
 
+    def compact(self, keep_raw: bool = False) -> CompactGenAIResponse:
+        """
+        Get a compact copy of this response, built on first use.
+
+        Args:
+            keep_raw: Keep a reference to the raw provider response
+
+        Returns:
+            CompactGenAIResponse object
+        """
+        if self._compact is None or (keep_raw and self._compact.raw is None):
+            if self.response is not None:
+                self._compact = CompactGenAIResponse.from_response(
+                    self.response, self.elapsed, keep_raw
+                )
+            else:
+                self._compact = CompactGenAIResponse(error=self.error, elapsed=self.elapsed)
+        return self._compact
+
     def __repr__(self) -> str:
         return f"GenAIResponse(response={self.response}, error={self.error})"
 
@@ -49,6 +77,9 @@ class GenAIResponse:
         return self.__repr__()
 
 
+ResponseType = Union[GenAIResponse, CompactGenAIResponse]
+
+
 class OpenAIClient:
     """
     OpenAI implementation of the GenAI client protocol
@@ -61,6 +92,9 @@ class OpenAIClient:
         base_url: Optional[str] = None,
         api_key: Optional[str] = None,
         model: Optional[str] = None,
+        compact_responses: bool = False,
+        keep_raw: bool = False,
+        embedding_model: Optional[str] = None,
     ):
         """
         Initialize the OpenAI Client with either provided OpenAI clients or create new ones.
@@ -71,9 +105,16 @@ class OpenAIClient:
             base_url: Base URL for the OpenAI API, used if clients are not provided
             api_key: API key for the OpenAI API, used if clients are not provided
             model: Default model to use for completions
+            compact_responses: Return CompactGenAIResponse objects instead of
+                GenAIResponse, for workloads that retain many results
+            keep_raw: With compact_responses, also keep the raw response payload
+            embedding_model: Default model to use for embeddings
         """
         self.base_url = base_url
         self.model = model
+        self.compact_responses = compact_responses
+        self.keep_raw = keep_raw
+        self.embedding_model = embedding_model
 
         # Use provided clients or create new ones
         if openai_client is not None:
@@ -100,11 +141,30 @@ class OpenAIClient:
                 "Either provide an async_openai_client or both base_url and api_key"
             )
 
-    def get_active_models(self) -> List:
-        return self._client.models.list()
+    def get_active_models(self, timeout: Optional[float] = None) -> List:
+        if timeout is None:
+            return self._client.models.list()
+        # A timeout is a bound on the whole call, so do not retry within it
+        return self._client.with_options(timeout=timeout, max_retries=0).models.list()
+
+    def get_active_model_names(self, timeout: Optional[float] = None) -> List[str]:
+        return [model.id for model in self.get_active_models(timeout)]
 
-    def get_active_model_names(self) -> List[str]:
-        return [model.id for model in self.get_active_models()]
+    def embed(
+        self,
+        texts: List[str],
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> List[List[float]]:
+        request = {"model": model or self.embedding_model, "input": texts}
+        if timeout is not None:
+            request["timeout"] = timeout
+        try:
+            response = self._client.embeddings.create(**request)
+            return [item.embedding for item in response.data]
+        except openai.OpenAIError as e:
+            logger.error(f"OpenAIError: {e}")
+            raise
 
     def completion(
         self,
@@ -112,35 +172,132 @@ class OpenAIClient:
         context: Optional[str] = None,
         model: Optional[str] = None,
         temperature: float = 0,
-    ) -> GenAIResponse:
+        timeout: Optional[float] = None,
+    ) -> ResponseType:
+        return self.chat(
+            self._build_messages(prompt, context), model, temperature, timeout=timeout
+        )
+
+    async def async_completion(
+        self,
+        prompt: str,
+        context: Optional[str] = None,
+        model: Optional[str] = None,
+        temperature: float = 0,
+        timeout: Optional[float] = None,
+    ) -> ResponseType:
+        return await self.async_chat(
+            self._build_messages(prompt, context), model, temperature, timeout=timeout
+        )
+
+    def chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0,
+        response_format: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> ResponseType:
+        started = time.perf_counter()
         try:
             response = self._client.chat.completions.create(
-                model=model or self.model,
-                temperature=temperature,
-                messages=self._build_messages(prompt, context),
+                **self._request(messages, model, temperature, response_format, timeout)
             )
-            return GenAIResponse.from_response(response)
+            return self._wrap_response(response, started)
         except openai.OpenAIError as e:
             logger.error(f"OpenAIError: {e}")
-            return GenAIResponse.from_exception(e)
+            return self._wrap_exception(e, started)
 
-    async def async_completion(
+    async def async_chat(
         self,
-        prompt: str,
-        context: Optional[str] = None,
+        messages: List[Dict[str, str]],
         model: Optional[str] = None,
         temperature: float = 0,
-    ) -> GenAIResponse:
+        response_format: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> ResponseType:
+        started = time.perf_counter()
         try:
             response = await self._aclient.chat.completions.create(
-                model=model or self.model,
-                temperature=temperature,
-                messages=self._build_messages(prompt, context),
+                **self._request(messages, model, temperature, response_format, timeout)
+            )
+            return self._wrap_response(response, started)
+        except openai.OpenAIError as e:
+            logger.error(f"OpenAIError: {e}")
+            return self._wrap_exception(e, started)
+
+    def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0,
+        response_format: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> Iterator[str]:
+        try:
+            stream = self._client.chat.completions.create(
+                stream=True,
+                **self._request(messages, model, temperature, response_format, timeout),
             )
-            return GenAIResponse.from_response(response)
+            with stream:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
         except openai.OpenAIError as e:
             logger.error(f"OpenAIError: {e}")
-            return GenAIResponse.from_exception(e)
+            raise
+
+    async def async_stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0,
+        response_format: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        try:
+            stream = await self._aclient.chat.completions.create(
+                stream=True,
+                **self._request(messages, model, temperature, response_format, timeout),
+            )
+            async with stream:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+        except openai.OpenAIError as e:
+            logger.error(f"OpenAIError: {e}")
+            raise
+
+    def _wrap_response(self, response: Any, started: float) -> ResponseType:
+        elapsed = time.perf_counter() - started
+        if self.compact_responses:
+            return CompactGenAIResponse.from_response(response, elapsed, self.keep_raw)
+        return GenAIResponse.from_response(response, elapsed)
+
+    def _wrap_exception(self, ex: Exception, started: float) -> ResponseType:
+        elapsed = time.perf_counter() - started
+        if self.compact_responses:
+            return CompactGenAIResponse.from_exception(ex, elapsed)
+        return GenAIResponse.from_exception(ex, elapsed)
+
+    def _request(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str],
+        temperature: float,
+        response_format: Optional[Dict[str, Any]],
+        timeout: Optional[float],
+    ) -> Dict[str, Any]:
+        request = {
+            "model": model or self.model,
+            "temperature": temperature,
+            "messages": messages,
+        }
+        if response_format is not None:
+            request["response_format"] = response_format
+        if timeout is not None:
+            request["timeout"] = timeout
+        return request
 
     def _build_messages(
         self, prompt: str, context: Optional[str] = None
@@ -183,6 +340,7 @@ def create_genai_service(
     api_key: str,
     default_model: Optional[str] = None,
     client_class: Type = OpenAIClient,
+    **client_options: Any,
 ) -> GenAIService:
     """
     Create a GenAIService with the specified client configuration.
@@ -192,9 +350,12 @@ def create_genai_service(
         api_key: The API key for authentication
         default_model: Optional default model to use
         client_class: The client class to use (defaults to OpenAIClient)
+        **client_options: Extra client options, e.g. compact_responses=True
 
     Returns:
         Configured GenAIService instance
     """
-    client = client_class(base_url=base_url, api_key=api_key, model=default_model)
+    client = client_class(
+        base_url=base_url, api_key=api_key, model=default_model, **client_options
+    )
     return GenAIService(client)
@@ -0,0 +1,295 @@
+"""
+Structured (JSON) output support: an incremental JSON parser for streamed
+responses and a small JSON Schema validator.
+"""
+import json
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+Path = Tuple[Any, ...]
+SchemaError = Tuple[Path, str]
+
+_WHITESPACE = " \t\r\n"
+_SCALAR_END = ",}]" + _WHITESPACE
+
+
+class IncrementalJSONParser:
+    """
+    Parse a JSON document as it arrives in chunks.
+
+    Every value that completes at a depth of at most `max_depth` is reported
+    as a (path, value) event as soon as its closing character arrives. With
+    the default depth of 2, a top-level object reports each field, and each
+    element of arrays held in those fields, before the document is complete.
+    Anything before the opening bracket (such as a Markdown code fence) is
+    ignored.
+
+    Containers down to `max_depth` are assembled from their parsed children,
+    and only the text of values still open is kept, so parsing takes time
+    linear in the document size however it is chunked.
+    """
+
+    def __init__(self, max_depth: int = 2):
+        self.max_depth = max_depth
+        self.value: Any = None
+        self.done = False
+
+        # Containers at this level or above are built from their children;
+        # deeper values are parsed from their text once complete
+        self._built_levels = max(max_depth, 1)
+        # Unconsumed text, starting at absolute position _offset
+        self._pieces: Deque[str] = deque()
+        self._offset = 0
+        self._length = 0
+        self._tail = ""
+        # Frames are [kind, slot, expect, value_start, container]; slot is the
+        # current key or index, container the value built so far (or None)
+        self._root = ["root", None, "value", None, None]
+        self._stack: List[list] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._scalar_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+        """
+        Consume a chunk of text.
+
+        Args:
+            chunk: The next piece of the document
+
+        Returns:
+            (path, value) events for the values completed by this chunk
+        """
+        events: List[Tuple[Path, Any]] = []
+        if self.done or not chunk:
+            return events
+        base = self._length
+        self._pieces.append(chunk)
+        self._length += len(chunk)
+        self._tail = (self._tail + chunk[-80:])[-80:]
+
+        for j, c in enumerate(chunk):
+            if self.done:
+                break
+            # Positions are absolute, counted from the start of the document
+            i = base + j
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        frame = self._frame()
+                        if len(self._stack) <= self._built_levels:
+                            frame[1] = json.loads(self._slice(self._string_start, i + 1))
+                        frame[2] = "colon"
+                    else:
+                        self._complete(self._string_start, i + 1, events)
+                continue
+
+            if self._scalar_start is not None:
+                if c not in _SCALAR_END:
+                    continue
+                # The terminating character is processed below as usual
+                self._complete(self._scalar_start, i, events)
+                self._scalar_start = None
+
+            frame = self._frame()
+            if frame is self._root and c not in "{[":
+                pass
+            elif c in _WHITESPACE:
+                pass
+            elif c == '"':
+                self._in_string = True
+                self._string_start = i
+                self._string_is_key = frame[0] == "object" and frame[2] == "key"
+            elif c == ":":
+                frame[2] = "value"
+            elif c == ",":
+                if frame[0] == "array":
+                    frame[1] += 1
+                frame[2] = "key" if frame[0] == "object" else "value"
+            elif c in "{[":
+                frame[3] = i
+                built = len(self._stack) < self._built_levels
+                if c == "{":
+                    self._stack.append(["object", None, "key", None, {} if built else None])
+                else:
+                    self._stack.append(["array", 0, "value", None, [] if built else None])
+            elif c in "}]":
+                container = self._stack.pop()[4]
+                self._complete(self._frame()[3], i + 1, events, container)
+            else:
+                self._scalar_start = i
+
+        self._trim()
+        return events
+
+    def close(self) -> Any:
+        """
+        Finish parsing and return the complete document.
+
+        Raises:
+            ValueError: If the text fed so far is not a complete JSON document
+        """
+        if not self.done:
+            raise ValueError(f"Incomplete JSON document: {self._tail!r}")
+        return self.value
+
+    def _frame(self) -> list:
+        return self._stack[-1] if self._stack else self._root
+
+    def _slice(self, start: int, end: int) -> str:
+        # Values being sliced start after every other value still needed, so
+        # the text before `start` can go
+        if len(self._pieces) > 1:
+            text = "".join(self._pieces)[start - self._offset :]
+            self._pieces = deque([text])
+            self._offset = start
+        return self._pieces[0][start - self._offset : end - self._offset]
+
+    def _trim(self) -> None:
+        # Drop the pieces before the earliest value that is still open
+        keep = self._length
+        if self._in_string:
+            keep = self._string_start
+        elif self._scalar_start is not None:
+            keep = self._scalar_start
+        if len(self._stack) > self._built_levels:
+            keep = min(keep, self._stack[self._built_levels - 1][3])
+        while self._pieces and self._offset + len(self._pieces[0]) <= keep:
+            self._offset += len(self._pieces.popleft())
+
+    def _complete(
+        self, start: int, end: int, events: List[Tuple[Path, Any]], value: Any = None
+    ) -> None:
+        frame = self._frame()
+        frame[2] = "comma"
+        depth = len(self._stack)
+        # Part of a deeper value, which is parsed as a whole
+        if depth > self._built_levels:
+            return
+
+        if value is None:
+            value = json.loads(self._slice(start, end))
+        if depth == 0:
+            self.value = value
+            self.done = True
+            return
+
+        if frame[0] == "object":
+            frame[4][frame[1]] = value
+        else:
+            frame[4].append(value)
+        if depth <= self.max_depth:
+            path = tuple(f[1] for f in self._stack)
+            events.append((path, value))
+
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "null": type(None),
+}
+
+
+def validate(value: Any, schema: Dict[str, Any], path: Path = ()) -> List[SchemaError]:
+    """
+    Validate a value against a subset of JSON Schema: type, enum, properties,
+    required, additionalProperties (false), items, minItems and maxItems.
+
+    Args:
+        value: The value to validate
+        schema: The JSON schema
+        path: Path of the value within the document, used in error reports
+
+    Returns:
+        List of (path, message) errors; empty if the value is valid
+    """
+    expected = schema.get("type")
+    if expected is not None:
+        types = expected if isinstance(expected, list) else [expected]
+        if not any(_is_type(value, t) for t in types):
+            return [(path, f"expected {' or '.join(types)}, got {type(value).__name__}")]
+
+    errors: List[SchemaError] = []
+
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append((path, f"{value!r} is not one of {schema['enum']}"))
+
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append((path + (key,), "required field is missing"))
+        for key, item in value.items():
+            if key in properties:
+                errors.extend(validate(item, properties[key], path + (key,)))
+            elif schema.get("additionalProperties") is False:
+                errors.append((path + (key,), "unexpected field"))
+
+    if isinstance(value, list):
+        if "minItems" in schema and len(value) < schema["minItems"]:
+            errors.append((path, f"expected at least {schema['minItems']} items"))
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errors.append((path, f"expected at most {schema['maxItems']} items"))
+        if "items" in schema:
+            for index, item in enumerate(value):
+                errors.extend(validate(item, schema["items"], path + (index,)))
+
+    return errors
+
+
+def _is_type(value: Any, name: str) -> bool:
+    # bool is a subclass of int, but JSON keeps them apart
+    if name in ("integer", "number") and isinstance(value, bool):
+        return False
+    return isinstance(value, _TYPES.get(name, object))
+
+
+def format_path(path: Path) -> str:
+    """Render a path as a JSON-pointer-like string, e.g. /items/3/name."""
+    return "/" + "/".join(str(part) for part in path)
+
+
+class StructuredResult:
+    """
+    Result of a structured output request.
+
+    `value` holds the parsed document, with any successfully repaired items
+    merged in; `errors` lists the validation errors that remain.
+    """
+
+    def __init__(
+        self,
+        value: Any = None,
+        errors: Optional[List[SchemaError]] = None,
+        requests: int = 0,
+    ):
+        self.value = value
+        self.errors = errors or []
+        self.requests = requests
+
+    def failure(self) -> bool:
+        return self.value is None or bool(self.errors)
+
+    def unwrap(self) -> Any:
+        return self.value
+
+    def error_messages(self) -> List[str]:
+        return [f"{format_path(path)}: {message}" for path, message in self.errors]
+
+    def __repr__(self) -> str:
+        return f"StructuredResult(value={self.value}, errors={self.errors}, requests={self.requests})"
+
+    def __str__(self) -> str:
+        return self.__repr__()
@@ -1,26 +1,208 @@
+"""
+Container health probe.
+
+Checks one or more HTTP endpoints concurrently, each bounded by a strict
+timeout, and optionally probes GenAI readiness. Only the standard library is
+imported on the hot path; the GenAI stack is loaded lazily, and only when the
+cached readiness result has expired.
+
+Usage:
+    python healthcheck.py <url> [<url> ...] [--timeout SECONDS] [--genai] [--json]
+"""
+import argparse
+import json
+import os
 import sys
-import urllib.request
+import tempfile
+import threading
+import time
 import urllib.error
+import urllib.request
+
+DEFAULT_TIMEOUT = 2.0
+GENAI_CACHE_TTL = float(os.environ.get("HEALTHCHECK_GENAI_TTL", 60))
+GENAI_CACHE_PATH = os.environ.get(
+    "HEALTHCHECK_GENAI_CACHE",
+    os.path.join(tempfile.gettempdir(), "rda-healthcheck-genai.json"),
+)
 
-def main():
-    if len(sys.argv) != 2:
-        print("Usage: python healthcheck.py <url>", file=sys.stderr)
-        sys.exit(1)
 
-    url = sys.argv[1]
+def check_url(url, timeout):
+    """Issue a GET request and report success, status and latency."""
+    started = time.perf_counter()
+    result = {"name": "http", "target": url, "ok": False}
 
     try:
-        with urllib.request.urlopen(url) as response:
-            if response.status == 200:
-                sys.exit(0)
-            else:
-                print(f"Health check failed: status {response.status}", file=sys.stderr)
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            result["status"] = response.status
+            result["ok"] = response.status == 200
+            if not result["ok"]:
+                result["error"] = f"status {response.status}"
+    except urllib.error.HTTPError as e:
+        result["status"] = e.code
+        result["error"] = f"status {e.code}"
     except urllib.error.URLError as e:
-        print(f"Health check failed: {e.reason}", file=sys.stderr)
+        result["error"] = f"{e.reason}"
     except Exception as e:
-        print(f"Unexpected error: {e}", file=sys.stderr)
+        result["error"] = f"{e}"
+
+    result["latency_ms"] = _elapsed_ms(started)
+    return result
+
+
+def check_genai(timeout):
+    """
+    Check that the GenAI provider is reachable.
+
+    A successful get_active_model_names call is cached on disk for
+    HEALTHCHECK_GENAI_TTL seconds, so frequent probes only read a small file.
+    """
+    started = time.perf_counter()
+    result = {"name": "genai", "target": "get_active_model_names", "ok": False}
+
+    cached = _read_genai_cache()
+    if cached is not None:
+        result.update(ok=True, cached=True, models=cached["models"])
+    else:
+        try:
+            models = _fetch_model_names(timeout)
+            _write_genai_cache(models)
+            result.update(ok=True, cached=False, models=len(models))
+        except Exception as e:
+            result["error"] = f"{e}"
+
+    result["latency_ms"] = _elapsed_ms(started)
+    return result
+
+
+def run_checks(urls, timeout=DEFAULT_TIMEOUT, genai=False):
+    """
+    Run all checks concurrently and wait at most `timeout` seconds for them.
+
+    Checks that have not finished by the deadline are reported as timed out.
+    They run on daemon threads, so a hung endpoint cannot keep the probe alive.
+
+    Returns:
+        A report dictionary with an overall status and per-check results
+    """
+    started = time.perf_counter()
+    checks = [("http", url, lambda url=url: check_url(url, timeout)) for url in urls]
+    if genai:
+        checks.append(
+            ("genai", "get_active_model_names", lambda: check_genai(timeout))
+        )
+
+    results = [None] * len(checks)
+
+    def worker(index, check):
+        results[index] = check()
+
+    threads = [
+        threading.Thread(target=worker, args=(index, check), daemon=True)
+        for index, (_, _, check) in enumerate(checks)
+    ]
+    for thread in threads:
+        thread.start()
+
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+    for index, (name, target, _) in enumerate(checks):
+        if results[index] is None:
+            results[index] = {
+                "name": name,
+                "target": target,
+                "ok": False,
+                "error": f"timed out after {timeout}s",
+                "latency_ms": round(timeout * 1000, 2),
+            }
+
+    return {
+        "status": "pass" if all(r["ok"] for r in results) else "fail",
+        "latency_ms": _elapsed_ms(started),
+        "checks": results,
+    }
+
+
+def _fetch_model_names(timeout):
+    # Imported lazily: loading the GenAI stack is the expensive part of a probe
+    started = time.monotonic()
+    from shared.genai import get_service
+
+    service = get_service()
+    # The request gets what is left of the probe's deadline
+    remaining = timeout - (time.monotonic() - started)
+    if remaining <= 0:
+        raise TimeoutError(f"timed out after {timeout}s")
+    return service.get_active_model_names(timeout=remaining)
+
+
+def _read_genai_cache():
+    try:
+        with open(GENAI_CACHE_PATH, "r") as f:
+            cached = json.load(f)
+        if time.time() - cached["timestamp"] < GENAI_CACHE_TTL:
+            return cached
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def _write_genai_cache(models):
+    # Write to a temporary file first so concurrent probes never read a partial file
+    tmp_path = f"{GENAI_CACHE_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump({"timestamp": time.time(), "models": len(models)}, f)
+        os.replace(tmp_path, GENAI_CACHE_PATH)
+    except OSError as e:
+        print(f"Could not write GenAI health cache: {e}", file=sys.stderr)
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Container health probe")
+    parser.add_argument("urls", nargs="*", help="Endpoints that must return HTTP 200")
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help=f"Deadline in seconds for all checks (default: {DEFAULT_TIMEOUT})",
+    )
+    parser.add_argument(
+        "--genai", action="store_true", help="Also probe GenAI readiness"
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Print the report as JSON on stdout"
+    )
+    args = parser.parse_args(argv)
+
+    if not args.urls and not args.genai:
+        parser.error("at least one url or --genai is required")
+
+    return args
+
+
+def main(argv=None):
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    report = run_checks(args.urls, timeout=args.timeout, genai=args.genai)
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for check in report["checks"]:
+            if not check["ok"]:
+                print(
+                    f"Health check failed: {check['target']}: {check['error']}",
+                    file=sys.stderr,
+                )
+
+    sys.exit(0 if report["status"] == "pass" else 1)
 
-    sys.exit(1)
 
 if __name__ == "__main__":
     main()
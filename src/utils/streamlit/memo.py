@@ -0,0 +1,665 @@
+"""
+Memoization for Streamlit app data, shared across reruns and sessions.
+
+Streamlit re-executes the whole app script on every interaction, so anything
+computed in it (model lists, search results, LLM output) is recomputed on
+every rerun. Decorating those functions with @memoize keeps their results in
+one of three scopes:
+
+    session  Per browser session; dropped when the session ends
+    process  Shared by all sessions of the server process
+    disk     Persisted in SQLite, shared across processes and restarts
+
+Each cache is an LRU bounded by entry count and by estimated size in bytes,
+with optional per-entry TTL. Entries can depend on tags, and invalidate(tag)
+drops every entry depending on it in all scopes. Concurrent misses on the
+same key compute the value once.
+
+Caches are registered by the function's qualified name rather than by
+function object. The app script is re-executed on every rerun and hot
+reload, redefining its functions each time; keying by name makes the new
+definition reuse the existing cache, and a changed function body clears it,
+so reloads never accumulate stale caches.
+"""
+from __future__ import annotations
+
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ("session", "process", "disk")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_PATH = os.path.join("data", "memo.db")
+
+# Tags are given as a list, or computed from the call arguments
+Tags = Union[Iterable[str], Callable[..., Iterable[str]]]
+
+_MISSING = object()
+
+
+class CacheStats:
+    """Counters for one cache."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.entries = 0
+        self.size = 0
+        self.compute_time = 0.0
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def add(self, other: CacheStats) -> None:
+        for name, value in vars(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**vars(self), "hit_rate": round(self.hit_rate(), 4)}
+
+    def __repr__(self) -> str:
+        return (
+            f"CacheStats(hits={self.hits}, misses={self.misses}, entries={self.entries}, "
+            f"size={self.size}, evictions={self.evictions})"
+        )
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires", "tags")
+
+    def __init__(self, value: Any, size: int, expires: Optional[float], tags: Tuple[str, ...]):
+        self.value = value
+        self.size = size
+        self.expires = expires
+        self.tags = tags
+
+
+class MemoryCache:
+    """
+    Thread-safe LRU cache bounded by entry count and total estimated size.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._tags: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Get a value, or _MISSING. A hit makes the entry most recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry.expires is not None and entry.expires <= time.time():
+                self._remove(key)
+                self.stats.expirations += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None, tags: Tuple[str, ...] = ()) -> None:
+        size = estimate_size(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Larger than the whole cache: caching it would only evict everything else
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            expires = time.time() + ttl if ttl is not None else None
+            self._entries[key] = _Entry(value, size, expires, tags)
+            self.stats.entries += 1
+            self.stats.size += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+            while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self.stats.size > self.max_bytes)
+            ):
+                self._remove(next(iter(self._entries)))
+                self.stats.evictions += 1
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        """Remove the entries depending on any of `tags`. Returns the number removed."""
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            self.stats.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self.stats.entries = self.stats.size = 0
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self.stats.entries -= 1
+        self.stats.size -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def __repr__(self) -> str:
+        return f"MemoryCache(entries={self.stats.entries}, size={self.stats.size})"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+DISK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS memo (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (name, key)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS memo_accessed ON memo (name, accessed);
+
+CREATE TABLE IF NOT EXISTS memo_tags (
+    tag TEXT NOT NULL,
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (tag, name, key)
+) WITHOUT ROWID;
+"""
+
+
+class DiskCache:
+    """
+    LRU cache persisted in SQLite, holding pickled values of one function.
+    Several DiskCaches can share a database file.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: str = DEFAULT_DISK_PATH,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+    ):
+        self.name = name
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(DISK_SCHEMA)
+        self._conn.commit()
+        self._refresh_stats()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires FROM memo WHERE name = ? AND key = ?", (self.name, key)
+            ).fetchone()
+            if row is None:
+                return _MISSING
+
+            now = time.time()
+            with self._conn:
+                if row[1] is not None and row[1] <= now:
+                    self._delete([key])
+                    self.stats.expirations += 1
+                    return _MISSING
+                self._conn.execute(
+                    "UPDATE memo SET accessed = ? WHERE name = ? AND key = ?", (now, self.name, key)
+                )
+        return pickle.loads(row[0])
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = None, tags: Tuple[str, ...] = ()) -> None:
+        try:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.warning(f"Not caching {self.name} on disk, value cannot be pickled: {e}")
+            return
+        if self.max_bytes is not None and len(payload) > self.max_bytes:
+            return
+
+        now = time.time()
+        expires = now + ttl if ttl is not None else None
+        with self._lock, self._conn:
+            self._delete([key])
+            self._conn.execute(
+                "INSERT INTO memo (name, key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.name, key, payload, len(payload), expires, now),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO memo_tags (tag, name, key) VALUES (?, ?, ?)",
+                [(tag, self.name, key) for tag in tags],
+            )
+            self.stats.entries += 1
+            self.stats.size += len(payload)
+            self._evict()
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        with self._lock, self._conn:
+            keys = set()
+            for tag in tags:
+                keys.update(
+                    row[0] for row in self._conn.execute(
+                        "SELECT key FROM memo_tags WHERE tag = ? AND name = ?", (tag, self.name)
+                    )
+                )
+            self._delete(list(keys))
+            self.stats.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM memo WHERE name = ?", (self.name,))
+            self._conn.execute("DELETE FROM memo_tags WHERE name = ?", (self.name,))
+            self.stats.entries = self.stats.size = 0
+
+    def drop_other_versions(self, prefix: str) -> None:
+        """Delete the entries of other cache names starting with `prefix`."""
+        with self._lock, self._conn:
+            pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            for table in ("memo", "memo_tags"):
+                self._conn.execute(
+                    f"DELETE FROM {table} WHERE name LIKE ? ESCAPE '\\' AND name != ?",
+                    (pattern, self.name),
+                )
+
+    def _evict(self) -> None:
+        # Least recently accessed entries go first
+        while self.stats.entries and (
+            (self.max_entries is not None and self.stats.entries > self.max_entries)
+            or (self.max_bytes is not None and self.stats.size > self.max_bytes)
+        ):
+            keys = [
+                row[0] for row in self._conn.execute(
+                    "SELECT key FROM memo WHERE name = ? ORDER BY accessed LIMIT 16", (self.name,)
+                )
+            ]
+            for key in keys:
+                if not (
+                    (self.max_entries is not None and self.stats.entries > self.max_entries)
+                    or (self.max_bytes is not None and self.stats.size > self.max_bytes)
+                ):
+                    break
+                self._delete([key])
+                self.stats.evictions += 1
+
+    def _delete(self, keys: List[str]) -> None:
+        # Entries and size are tracked as rows change, like MemoryCache does;
+        # the table is only counted when the cache is opened
+        for key in keys:
+            row = self._conn.execute(
+                "SELECT size FROM memo WHERE name = ? AND key = ?", (self.name, key)
+            ).fetchone()
+            if row is None:
+                continue
+            self._conn.execute("DELETE FROM memo WHERE name = ? AND key = ?", (self.name, key))
+            self.stats.entries -= 1
+            self.stats.size -= row[0]
+        self._conn.executemany(
+            "DELETE FROM memo_tags WHERE name = ? AND key = ?", [(self.name, key) for key in keys]
+        )
+
+    def _refresh_stats(self) -> None:
+        entries, size = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM memo WHERE name = ?", (self.name,)
+        ).fetchone()
+        self.stats.entries, self.stats.size = entries, size
+
+    def __repr__(self) -> str:
+        return f"DiskCache(name={self.name}, path={self.path}, entries={self.stats.entries})"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+class Memoized:
+    """
+    A memoized function. Created by @memoize; call it like the function.
+    """
+
+    def __init__(
+        self,
+        func: Callable,
+        scope: str,
+        ttl: Optional[float],
+        max_entries: Optional[int],
+        max_bytes: Optional[int],
+        depends_on: Optional[Tags],
+        key: Optional[Callable[..., Hashable]],
+        path: Optional[str],
+    ):
+        self.func = func
+        self.name = f"{func.__module__}.{func.__qualname__}"
+        self.fingerprint = _fingerprint(func)
+        # Everything that changes the cached results, compared on redefinition
+        self.definition = (
+            self.fingerprint, scope, ttl, max_entries, max_bytes,
+            _fingerprint(depends_on) if callable(depends_on) else repr(depends_on),
+            _fingerprint(key), path,
+        )
+        self.scope = scope
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.depends_on = depends_on
+        self.key = key
+        self.path = path or os.environ.get("MEMO_DISK_PATH", DEFAULT_DISK_PATH)
+
+        self._lock = threading.Lock()
+        self._process_cache: Optional[MemoryCache] = None
+        self._disk_cache: Optional[DiskCache] = None
+        self._session_caches: Dict[str, MemoryCache] = {}
+        self._pending: Dict[Hashable, threading.Event] = {}
+        # Bumped by invalidate() per tag and by clear(), so a value computed
+        # before an invalidation is not stored after it
+        self._tag_generations: Dict[str, int] = {}
+        self._clear_generation = 0
+        functools.update_wrapper(self, func)
+
+    def __call__(self, *args, **kwargs):
+        key = self._make_key(args, kwargs)
+        cache = self._cache()
+
+        while True:
+            value = cache.get(key)
+            if value is not _MISSING:
+                cache.stats.hits += 1
+                return value
+
+            # Only one caller computes a missing value; the others wait for it
+            with self._lock:
+                pending = self._pending.get((id(cache), key))
+                if pending is None:
+                    pending = self._pending[(id(cache), key)] = threading.Event()
+                    break
+            pending.wait()
+
+        try:
+            cache.stats.misses += 1
+            tags = self._tags(args, kwargs)
+            generation = self._generation(tags)
+            started = time.perf_counter()
+            value = self.func(*args, **kwargs)
+            cache.stats.compute_time += time.perf_counter() - started
+            # The value may predate data invalidated while it was computed
+            if self._generation(tags) == generation:
+                cache.put(key, value, self.ttl, tags)
+            return value
+        finally:
+            with self._lock:
+                del self._pending[(id(cache), key)]
+            pending.set()
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        """Drop the entries of this function depending on any of `tags`, in every cache."""
+        tags = list(tags)
+        with self._lock:
+            for tag in tags:
+                self._tag_generations[tag] = self._tag_generations.get(tag, 0) + 1
+        return sum(cache.invalidate(tags) for cache in self._caches())
+
+    def clear(self) -> None:
+        """Drop all entries of this function, in every cache."""
+        with self._lock:
+            self._clear_generation += 1
+        for cache in self._caches():
+            cache.clear()
+
+    def clear_memory(self) -> None:
+        """Drop the in-memory caches; disk entries are kept."""
+        with self._lock:
+            self._process_cache = None
+            self._session_caches.clear()
+
+    def drop_session(self, session_id: str) -> None:
+        with self._lock:
+            self._session_caches.pop(session_id, None)
+
+    def stats(self) -> CacheStats:
+        """Combined stats of every cache of this function."""
+        total = CacheStats()
+        for cache in self._caches():
+            total.add(cache.stats)
+        return total
+
+    def _cache(self) -> Union[MemoryCache, DiskCache]:
+        with self._lock:
+            if self.scope == "process":
+                if self._process_cache is None:
+                    self._process_cache = MemoryCache(self.max_entries, self.max_bytes)
+                return self._process_cache
+
+            if self.scope == "disk":
+                if self._disk_cache is None:
+                    self._disk_cache = DiskCache(
+                        f"{self.name}:{self.fingerprint}", self.path, self.max_entries, self.max_bytes
+                    )
+                    # Results of previous versions of the function are stale
+                    self._disk_cache.drop_other_versions(f"{self.name}:")
+                return self._disk_cache
+
+            ctx = get_script_run_ctx()
+            session_id = ctx.session_id if ctx else ""
+            cache = self._session_caches.get(session_id)
+            if cache is None:
+                cache = self._session_caches[session_id] = MemoryCache(self.max_entries, self.max_bytes)
+                if ctx is not None:
+                    _drop_on_session_end(self, session_id)
+            return cache
+
+    def _caches(self) -> List[Union[MemoryCache, DiskCache]]:
+        with self._lock:
+            caches = list(self._session_caches.values())
+            if self._process_cache is not None:
+                caches.append(self._process_cache)
+        if self.scope == "disk":
+            caches.append(self._cache())
+        return caches
+
+    def _make_key(self, args: tuple, kwargs: dict) -> Hashable:
+        if self.key is not None:
+            key = self.key(*args, **kwargs)
+        else:
+            key = (args, tuple(sorted(kwargs.items())))
+        if self.scope == "disk" or not _hashable(key):
+            # Disk keys must be stable across processes
+            key = hashlib.sha256(pickle.dumps(key, protocol=4)).hexdigest()
+        return key
+
+    def _generation(self, tags: Tuple[str, ...]) -> tuple:
+        with self._lock:
+            return (self._clear_generation, *(self._tag_generations.get(tag, 0) for tag in tags))
+
+    def _tags(self, args: tuple, kwargs: dict) -> Tuple[str, ...]:
+        if self.depends_on is None:
+            return ()
+        if callable(self.depends_on):
+            return tuple(self.depends_on(*args, **kwargs))
+        return tuple(self.depends_on)
+
+    def __repr__(self) -> str:
+        return f"Memoized(name={self.name}, scope={self.scope}, ttl={self.ttl})"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+# Memoized functions, by qualified name
+_registry: Dict[str, Memoized] = {}
+_registry_lock = threading.Lock()
+
+
+def memoize(
+    func: Optional[Callable] = None,
+    *,
+    scope: str = "process",
+    ttl: Optional[float] = None,
+    max_entries: Optional[int] = None,
+    max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+    depends_on: Optional[Tags] = None,
+    key: Optional[Callable[..., Hashable]] = None,
+    path: Optional[str] = None,
+):
+    """
+    Memoize a function's results.
+
+    Usable as @memoize or @memoize(scope=..., ...).
+
+    Args:
+        func: The function to memoize
+        scope: "session", "process" or "disk"
+        ttl: Optional entry lifetime, in seconds
+        max_entries: Optional maximum number of entries per cache
+        max_bytes: Maximum estimated size of each cache, in bytes
+        depends_on: Tags the entries depend on, or a function of the call
+            arguments returning them; see invalidate()
+        key: Optional function of the call arguments returning the cache
+            key, for arguments that cannot be hashed or pickled
+        path: Database for the disk scope, defaults to the MEMO_DISK_PATH
+            environment variable and then to data/memo.db
+
+    Returns:
+        The memoized function
+    """
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown memoization scope: {scope}")
+
+    def decorate(func: Callable) -> Memoized:
+        memoized = Memoized(func, scope, ttl, max_entries, max_bytes, depends_on, key, path)
+        with _registry_lock:
+            existing = _registry.get(memoized.name)
+            if existing is not None and existing.definition == memoized.definition:
+                # Same function redefined by a rerun: keep its caches
+                existing.func = func
+                return existing
+            if existing is not None:
+                existing.clear_memory()
+            _registry[memoized.name] = memoized
+        return memoized
+
+    return decorate(func) if func is not None else decorate
+
+
+def invalidate(*tags: str) -> int:
+    """
+    Drop every memoized entry depending on any of `tags`, in all scopes.
+
+    Returns:
+        Number of entries dropped
+    """
+    with _registry_lock:
+        functions = list(_registry.values())
+    return sum(memoized.invalidate(tags) for memoized in functions)
+
+
+def stats() -> Dict[str, CacheStats]:
+    """Stats of every memoized function, by qualified name."""
+    with _registry_lock:
+        functions = list(_registry.items())
+    return {name: memoized.stats() for name, memoized in functions}
+
+
+def reset() -> None:
+    """
+    Drop the in-memory caches of every memoized function; disk entries are
+    kept. The launcher calls this when the app (re)initializes.
+    """
+    with _registry_lock:
+        functions = list(_registry.values())
+    for memoized in functions:
+        memoized.clear_memory()
+
+
+def estimate_size(value: Any, _seen: Optional[set] = None) -> int:
+    """
+    Estimate the memory held by a value, following containers and object
+    attributes. Shared objects are counted once.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    size = sys.getsizeof(value, 0)
+    if isinstance(value, (str, bytes, bytearray, int, float, bool, type(None))):
+        return size
+    if isinstance(value, dict):
+        return size + sum(
+            estimate_size(k, _seen) + estimate_size(v, _seen) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(estimate_size(item, _seen) for item in value)
+    if hasattr(value, "__dict__"):
+        size += estimate_size(vars(value), _seen)
+    for slot in getattr(type(value), "__slots__", ()):
+        size += estimate_size(getattr(value, slot, None), _seen)
+    return size
+
+
+def _drop_on_session_end(memoized: Memoized, session_id: str) -> None:
+    # Imported here: the launcher imports this module to reset it
+    from utils.streamlit.streamlit_launcher import session_cancel_token
+
+    session_cancel_token().add_callback(lambda: memoized.drop_session(session_id))
+
+
+def _fingerprint(func: Any) -> str:
+    # Hash of the function's code, identical for every definition of the same source
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return repr(func)
+    return hashlib.sha256(_code_payload(code).encode("utf-8")).hexdigest()[:16]
+
+
+def _code_payload(code) -> str:
+    consts = [
+        _code_payload(const) if hasattr(const, "co_code") else repr(const)
+        for const in code.co_consts
+    ]
+    return repr((code.co_code, consts, code.co_names))
+
+
+def _hashable(key: Any) -> bool:
+    try:
+        hash(key)
+        return True
+    except TypeError:
+        return False
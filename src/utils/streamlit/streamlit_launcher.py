@@ -1,12 +1,21 @@
 import inspect
 import os
 import threading
+import time
 from streamlit import config as st_config
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from streamlit.web.bootstrap import run as st_run
 
+from utils.genai.cancellation import CancellationToken
+from utils.streamlit import memo
+
 DEFAULT_PORT = os.environ.get("PORT", 8501)
 HEADLESS = True
 
+# How often pending reruns and closed sessions are checked for, in seconds
+CANCELLATION_POLL_INTERVAL = 0.25
+
 
 def launch_streamlit(
     main_callback,
@@ -55,9 +64,38 @@ def launch_streamlit(
                 initializer_callback()
 
             _set_initialized()
+            # Memoized data follows the initialization lifecycle: clearing the
+            # flag to re-run the initializer also drops what was computed before
+            memo.reset()
 
         # Call the main callback
-        main_callback()
+        _run_main(main_callback)
+
+
+def run_cancel_token():
+    """
+    Get the cancellation token of the current script run.
+
+    The token is cancelled when the run ends, when a rerun is requested
+    (even while the script is blocked in a call) and when the session ends.
+    Pass it to GenAI calls so their work is dropped when nobody can see it.
+    """
+    ctx = get_script_run_ctx()
+    with _tokens_lock:
+        run = _runs.get(ctx.session_id) if ctx else None
+    return run[1] if run else CancellationToken()
+
+
+def session_cancel_token():
+    """
+    Get the cancellation token of the current session, cancelled only when
+    the session ends. Use it for work that should survive reruns.
+    """
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return CancellationToken()
+    with _tokens_lock:
+        return _sessions.setdefault(ctx.session_id, CancellationToken())
 
 
 def _launched_from_python_main():
@@ -75,3 +113,78 @@ def _initialized():
 
 def _set_initialized(flag=True):
     os.environ["STREAMLIT_INITIALIZED"] = "1" if flag else "0"
+
+
+# Cancellation tokens, keyed by session id
+_runs = {}  # session id -> (script run context, run token)
+_sessions = {}  # session id -> session token
+_tokens_lock = threading.Lock()
+_watcher = None
+
+
+def _run_main(main_callback):
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        main_callback()
+        return
+
+    session_token = session_cancel_token()
+    run_token = session_token.child()
+    with _tokens_lock:
+        _runs[ctx.session_id] = (ctx, run_token)
+    _ensure_watcher()
+
+    try:
+        main_callback()
+    finally:
+        # Rerun and stop requests surface here as exceptions; either way the
+        # run is over and nothing it started is still wanted
+        run_token.cancel("script run ended")
+        with _tokens_lock:
+            if _runs.get(ctx.session_id, (None, None))[1] is run_token:
+                del _runs[ctx.session_id]
+
+
+def _ensure_watcher():
+    global _watcher
+
+    with _tokens_lock:
+        if _watcher is None or not _watcher.is_alive():
+            _watcher = threading.Thread(
+                target=_watch_sessions, name="streamlit-cancellation", daemon=True
+            )
+            _watcher.start()
+
+
+def _watch_sessions():
+    # A rerun request only interrupts the script at its next Streamlit call,
+    # so a script blocked in a GenAI call is cancelled from here instead
+    while True:
+        time.sleep(CANCELLATION_POLL_INTERVAL)
+
+        with _tokens_lock:
+            runs = list(_runs.items())
+            sessions = list(_sessions.items())
+
+        for session_id, (ctx, token) in runs:
+            if _rerun_requested(ctx):
+                token.cancel("rerun requested")
+
+        for session_id, token in sessions:
+            if not _session_active(session_id):
+                token.cancel("session ended")
+                with _tokens_lock:
+                    _sessions.pop(session_id, None)
+                    _runs.pop(session_id, None)
+
+
+def _rerun_requested(ctx):
+    # ScriptRequests has no public accessor for its pending request
+    state = getattr(getattr(ctx, "script_requests", None), "_state", None)
+    return state is not None and getattr(state, "value", "CONTINUE") != "CONTINUE"
+
+
+def _session_active(session_id):
+    if not Runtime.exists():
+        return True
+    return Runtime.instance().is_active_session(session_id)
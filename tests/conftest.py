@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# Application code imports its packages from src, as in the Docker image
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from apps.notes.store import NotesStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = NotesStore(str(tmp_path / "notes.db"))
+    yield store
+    store.close()
@@ -0,0 +1,213 @@
+import asyncio
+import dataclasses
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from streamlit.runtime.scriptrunner_utils.script_requests import RerunData, ScriptRequests
+from streamlit.runtime.scriptrunner_utils.script_run_context import ScriptRunContext
+
+from utils.genai.cancellation import CancellationToken, DeadlineExceeded, RequestCancelled, combine
+from utils.genai.genai_service import GenAIService, _await_cancellable
+from utils.streamlit import streamlit_launcher
+
+
+class FakeClient:
+    """Client whose calls block until released, recording how they ended."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.calls = []
+        self.closed = False
+        self.async_cancelled = False
+
+    def completion(self, content, context=None, model=None, temperature=0, timeout=None):
+        self.calls.append(("completion", timeout))
+        self.started.set()
+        self.release.wait(5)
+        return SimpleNamespace(failure=lambda: False, unwrap=lambda: "answer")
+
+    async def async_completion(self, content, context=None, model=None, temperature=0, timeout=None):
+        self.calls.append(("async_completion", timeout))
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            self.async_cancelled = True
+            raise
+
+    def stream_chat(self, messages, model=None, temperature=0, timeout=None):
+        try:
+            for delta in ["a", "b", "c"]:
+                yield delta
+        finally:
+            self.closed = True
+
+    def embed(self, texts, model=None, timeout=None):
+        self.calls.append(("embed", timeout))
+        return [[0.0] for _ in texts]
+
+
+def test_child_is_cancelled_with_its_parent():
+    parent = CancellationToken()
+    child = parent.child()
+    parent.cancel("stop")
+    assert child.cancelled
+    assert child.reason == "stop"
+
+
+def test_released_child_is_detached_from_its_parent():
+    parent = CancellationToken()
+    child = parent.child()
+    assert len(parent._callbacks) == 1
+    child.release()
+    assert parent._callbacks == []
+    parent.cancel()
+    assert not child.cancelled
+
+
+def test_cancelling_a_child_leaves_the_parent_running():
+    parent = CancellationToken()
+    child = parent.child()
+    child.cancel()
+    assert not parent.cancelled
+    # A cancelled child no longer needs its parent's callback
+    assert parent._callbacks == []
+
+
+def test_child_keeps_the_tighter_deadline():
+    parent = CancellationToken(timeout=0.05)
+    assert parent.child(timeout=10).deadline == parent.deadline
+    assert parent.child(timeout=0.01).deadline < parent.deadline
+
+    child = parent.child()
+    time.sleep(0.06)
+    assert child.cancelled
+    assert isinstance(child.error(), DeadlineExceeded)
+
+
+def test_combine_never_returns_the_callers_token():
+    assert combine() is None
+    assert combine(timeout=1).deadline is not None
+    caller = CancellationToken()
+    token = combine(cancel_token=caller)
+    assert token is not caller
+    token.release()
+    assert not caller.cancelled
+
+
+def test_await_cancellable_enforces_the_deadline():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    token = CancellationToken(timeout=0.05)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(_await_cancellable(token, slow()))
+    assert time.monotonic() - started < 1
+    assert cancelled and token.cancelled
+
+
+def test_await_cancellable_is_interrupted_from_another_thread():
+    token = CancellationToken()
+    threading.Timer(0.05, token.cancel, args=("rerun requested",)).start()
+    with pytest.raises(RequestCancelled, match="rerun requested"):
+        asyncio.run(_await_cancellable(token, asyncio.sleep(5)))
+    assert token._callbacks == []
+
+
+def test_await_cancellable_does_not_start_on_a_cancelled_token():
+    ran = []
+
+    async def work():
+        ran.append(True)
+
+    token = CancellationToken()
+    token.cancel()
+    with pytest.raises(RequestCancelled):
+        asyncio.run(_await_cancellable(token, work()))
+    assert ran == []
+
+
+def test_sync_call_cancelled_while_running_returns_a_cancelled_response():
+    client = FakeClient()
+    caller = CancellationToken()
+    result = []
+    thread = threading.Thread(
+        target=lambda: result.append(
+            GenAIService(client).process_single_prompt("hi", timeout=10, cancel_token=caller)
+        )
+    )
+    thread.start()
+    assert client.started.wait(5)
+    caller.cancel("rerun requested")
+    client.release.set()
+    thread.join(5)
+
+    assert result[0].failure()
+    assert "rerun requested" in result[0].unwrap()
+    # The deadline is passed to the client as the request timeout
+    assert 0 < client.calls[0][1] <= 10
+
+
+def test_sync_call_releases_the_callers_token():
+    client = FakeClient()
+    client.release.set()
+    caller = CancellationToken()
+    response = GenAIService(client).process_single_prompt("hi", cancel_token=caller)
+    assert response.unwrap() == "answer"
+    assert caller._callbacks == []
+
+
+def test_async_call_past_its_deadline_is_cancelled():
+    client = FakeClient()
+    response = asyncio.run(
+        GenAIService(client).process_single_prompt_async("hi", timeout=0.05)
+    )
+    assert response.failure()
+    assert "deadline exceeded" in response.unwrap()
+    assert client.async_cancelled
+
+
+def test_cancelled_stream_closes_the_client_stream():
+    client = FakeClient()
+    caller = CancellationToken()
+    deltas = GenAIService(client).stream_messages([], cancel_token=caller)
+    assert next(deltas) == "a"
+    caller.cancel()
+    with pytest.raises(RequestCancelled):
+        next(deltas)
+    assert client.closed
+    assert caller._callbacks == []
+
+
+def test_embeddings_are_not_requested_on_a_cancelled_token():
+    client = FakeClient()
+    caller = CancellationToken()
+    caller.cancel()
+    with pytest.raises(RequestCancelled):
+        GenAIService(client).get_embeddings(["text"], cancel_token=caller)
+    assert client.calls == []
+
+
+def test_rerun_detection_matches_streamlit_script_requests():
+    # The launcher reads ScriptRequests' private state to notice reruns
+    # while the script is blocked; this breaks loudly if Streamlit changes it
+    assert "script_requests" in {field.name for field in dataclasses.fields(ScriptRunContext)}
+    ctx = SimpleNamespace(script_requests=ScriptRequests())
+    assert not streamlit_launcher._rerun_requested(ctx)
+    assert ctx.script_requests.request_rerun(RerunData())
+    assert streamlit_launcher._rerun_requested(ctx)
+
+    ctx = SimpleNamespace(script_requests=ScriptRequests())
+    ctx.script_requests.request_stop()
+    assert streamlit_launcher._rerun_requested(ctx)
+
+    assert not streamlit_launcher._rerun_requested(SimpleNamespace())
@@ -0,0 +1,118 @@
+import io
+import random
+import re
+import zipfile
+
+import pytest
+
+from apps.notes import ingest
+from apps.notes.ingest import Ingestor, chunk_text
+from apps.notes.jobs import JobScheduler
+
+
+def random_text(rng, lines, long_lines=True):
+    # Mostly short lines, with the occasional line longer than a chunk; numbered
+    # so that chunks are unique
+    return "\n".join(
+        f"{i} " + "x" * rng.choice([0, 5, 80, 300, 3999, 4000, 4001, 9000]) if long_lines and rng.random() < 0.1
+        else f"{i} " + " ".join(rng.choice(["alpha", "beta", "gamma"]) for _ in range(rng.randint(0, 30)))
+        for i in range(lines)
+    )
+
+
+def split_randomly(rng, text):
+    pieces, start = [], 0
+    while start < len(text):
+        end = start + rng.randint(1, 5000)
+        pieces.append(text[start:end])
+        start = end
+    return pieces
+
+
+@pytest.mark.parametrize(
+    "pieces",
+    [["b" * 3500 + "\n" + "a" * 3000], ["a" * 9000], ["a" * 4000 + "\n" + "b" * 4000], ["a"] * 9000],
+)
+def test_chunks_are_bounded(pieces):
+    chunks = list(chunk_text(iter(pieces)))
+    assert all(0 < len(chunk) <= 4000 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "") == "".join(pieces).replace("\n", "")
+
+
+def test_chunks_are_bounded_for_any_split():
+    rng = random.Random(0)
+    for _ in range(20):
+        text = random_text(rng, 400)
+        chunks = list(chunk_text(iter(split_randomly(rng, text)), min_chars=500, max_chars=2000))
+        assert all(0 < len(chunk) <= 2000 for chunk in chunks)
+        # Nothing is lost; only whitespace at chunk edges is stripped
+        assert re.sub(r"\s", "", "".join(chunks)) == re.sub(r"\s", "", text)
+        # Boundaries do not depend on how the text was split into pieces
+        assert chunks == list(chunk_text(iter([text]), min_chars=500, max_chars=2000))
+
+
+def test_edit_only_changes_nearby_chunks():
+    rng = random.Random(1)
+    lines = random_text(rng, 2000).split("\n")
+    edited = lines[:1000] + ["an inserted line"] + lines[1000:]
+    before = list(chunk_text(iter(["\n".join(lines)])))
+    after = list(chunk_text(iter(["\n".join(edited)])))
+    assert len(set(before) - set(after)) <= 2
+
+
+def test_ingest_deduplicates_uploads_and_chunks(store, tmp_path):
+    ingestor = Ingestor(store, str(tmp_path / "uploads"))
+    text = random_text(random.Random(2), 1000, long_lines=False).encode("utf-8")
+
+    first = ingestor.ingest(io.BytesIO(text), "doc.txt")
+    assert not first.duplicate and first.new_chunks == first.chunks > 1
+    assert store.count() == first.chunks
+
+    again = ingestor.ingest(io.BytesIO(text), "copy.txt")
+    assert again.duplicate and again.new_chunks == 0
+
+    # A zip holding the same text is a new upload, but its chunks are known
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as f:
+        f.writestr("doc.txt", text)
+    archive.seek(0)
+    zipped = ingestor.ingest(archive, "docs.zip")
+    assert not zipped.duplicate
+    assert zipped.chunks == first.chunks and zipped.new_chunks == 0
+    assert store.count() == first.chunks
+    assert list((tmp_path / "uploads").iterdir()) == []
+
+
+def test_imported_notes_are_queued_when_opened(store, tmp_path):
+    scheduler = JobScheduler(store, lambda: None, handlers={"summary": lambda s, t, c: t}).attach()
+    ingestor = Ingestor(store, str(tmp_path / "uploads"))
+
+    result = ingestor.ingest(io.BytesIO(random_text(random.Random(3), 500).encode("utf-8")), "doc.txt")
+    assert result.new_chunks > 1
+    assert scheduler.stats() == {}
+
+    note_id = store.list()[0].id
+    assert scheduler.enqueue_missing(note_id, priority=1) == 1
+    assert scheduler.stats() == {"pending": 1}
+    # Opening it again (every rerun) queues nothing more
+    assert scheduler.enqueue_missing(note_id, priority=1) == 0
+    # Notes written by users are still queued right away
+    store.create("Title", "Body")
+    assert scheduler.stats() == {"pending": 2}
+
+
+def test_unreadable_files_are_reported(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "pypdf", None)
+    ingestor = Ingestor(store, str(tmp_path / "uploads"))
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as f:
+        f.writestr("notes.txt", "some text")
+        f.writestr("scan.pdf", b"%PDF-1.4")
+        f.writestr("image.png", b"\x89PNG")
+    data = archive.getvalue()
+
+    result = ingestor.ingest(io.BytesIO(data), "docs.zip")
+    assert result.chunks == 1
+    assert result.skipped == ["docs.zip/scan.pdf", "docs.zip/image.png"]
+    # Not recorded as imported, so it can be imported again once supported
+    assert not ingestor.ingest(io.BytesIO(data), "docs.zip").duplicate
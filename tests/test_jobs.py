@@ -0,0 +1,145 @@
+import time
+
+from apps.notes.jobs import JobScheduler
+from utils.genai.cancellation import DeadlineExceeded
+
+
+def make_scheduler(store, handlers, **kwargs):
+    return JobScheduler(store, lambda: None, handlers=handlers, **kwargs)
+
+
+def job_row(scheduler, note_id, kind):
+    return scheduler._conn.execute(
+        "SELECT status, attempts, next_run, last_error FROM jobs WHERE note_id = ? AND kind = ?",
+        (note_id, kind),
+    ).fetchone()
+
+
+def run_next(scheduler):
+    job = scheduler._claim()
+    if job is not None:
+        scheduler._run(*job)
+    return job
+
+
+def test_deadline_is_retried_with_backoff(store):
+    def timeout(service, text, cancel_token):
+        raise DeadlineExceeded("deadline exceeded")
+
+    scheduler = make_scheduler(store, {"summary": timeout}, max_attempts=3, backoff=60)
+    note = store.create("Title", "Body")
+    assert scheduler.enqueue_note(note.id) == 1
+
+    assert run_next(scheduler) is not None
+    status, attempts, next_run, last_error = job_row(scheduler, note.id, "summary")
+    assert (status, attempts) == ("pending", 1)
+    assert next_run > time.time() + 30
+    assert "deadline" in last_error
+    # Backing off: the job is not claimed again right away
+    assert run_next(scheduler) is None
+
+
+def test_deadline_fails_after_max_attempts(store):
+    calls = []
+
+    def timeout(service, text, cancel_token):
+        calls.append(text)
+        raise DeadlineExceeded("deadline exceeded")
+
+    scheduler = make_scheduler(store, {"summary": timeout}, max_attempts=3, backoff=0)
+    note = store.create("Title", "Body")
+    scheduler.enqueue_note(note.id)
+
+    while run_next(scheduler) is not None:
+        assert len(calls) <= 3
+    assert len(calls) == 3
+    assert job_row(scheduler, note.id, "summary")[:2] == ("failed", 3)
+
+
+def test_failing_job_does_not_starve_others(store):
+    def handler(service, text, cancel_token):
+        if "slow" in text:
+            raise DeadlineExceeded("deadline exceeded")
+        return text.upper()
+
+    scheduler = make_scheduler(store, {"summary": handler}, backoff=60)
+    slow = store.create("slow", "note")
+    fast = store.create("fast", "note")
+    scheduler.enqueue(slow.id, "summary", "slow\nnote", priority=1)
+    scheduler.enqueue_note(fast.id)
+
+    run_next(scheduler)
+    run_next(scheduler)
+    assert scheduler.get_result(fast.id, "summary") == "FAST\nNOTE"
+    assert scheduler.get_result(slow.id, "summary") is None
+
+
+def test_stop_requeues_without_using_an_attempt(store):
+    def interrupted(service, text, cancel_token):
+        cancel_token.cancel("scheduler stopped")
+        cancel_token.raise_if_cancelled()
+
+    scheduler = make_scheduler(store, {"summary": interrupted})
+    note = store.create("Title", "Body")
+    scheduler.enqueue_note(note.id)
+
+    run_next(scheduler)
+    status, attempts, _, last_error = job_row(scheduler, note.id, "summary")
+    assert (status, attempts, last_error) == ("pending", 0, None)
+
+
+def test_results_are_deduplicated_by_content(store):
+    calls = []
+
+    def handler(service, text, cancel_token):
+        calls.append(text)
+        return "summary"
+
+    scheduler = make_scheduler(store, {"summary": handler})
+    first = store.create("Same", "content")
+    second = store.create("Same", "content")
+
+    assert scheduler.enqueue_note(first.id) == 1
+    run_next(scheduler)
+    # Unchanged content is not queued again, and equal content reuses the result
+    assert scheduler.enqueue_note(first.id) == 0
+    assert scheduler.enqueue_note(second.id) == 0
+    assert scheduler.get_result(second.id, "summary") == "summary"
+    assert len(calls) == 1
+
+
+def test_workers_complete_queued_jobs(store):
+    scheduler = make_scheduler(
+        store, {"summary": lambda service, text, token: text[::-1]}, poll_interval=0.05
+    ).attach()
+    scheduler.start()
+    try:
+        notes = [store.create(f"Note {i}", "body") for i in range(5)]
+        deadline = time.time() + 10
+        while time.time() < deadline and any(
+            scheduler.get_result(note.id, "summary") is None for note in notes
+        ):
+            time.sleep(0.05)
+    finally:
+        scheduler.stop()
+    assert scheduler.get_result(notes[0].id, "summary") == "ydob\n0 etoN"
+
+
+def test_failed_jobs_stay_failed_until_the_content_changes(store):
+    def broken(service, text, cancel_token):
+        raise RuntimeError("provider error")
+
+    scheduler = make_scheduler(store, {"summary": broken}, max_attempts=2, backoff=0)
+    note = store.create("Title", "Body")
+    scheduler.enqueue_note(note.id)
+    while run_next(scheduler) is not None:
+        pass
+    assert job_row(scheduler, note.id, "summary")[:2] == ("failed", 2)
+
+    assert scheduler.enqueue_note(note.id) == 0
+    assert scheduler.enqueue_missing(note.id) == 0
+    assert job_row(scheduler, note.id, "summary")[:2] == ("failed", 2)
+
+    store.update(note.id, body="New body")
+    assert scheduler.enqueue_note(note.id) == 1
+    assert job_row(scheduler, note.id, "summary")[:2] == ("pending", 0)
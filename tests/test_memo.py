@@ -0,0 +1,82 @@
+import random
+import time
+
+from utils.streamlit import memo
+from utils.streamlit.memo import DiskCache
+
+
+def table_stats(cache):
+    return cache._conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM memo WHERE name = ?", (cache.name,)
+    ).fetchone()
+
+
+def test_disk_cache_tracks_stats_incrementally(tmp_path):
+    path = str(tmp_path / "memo.db")
+    cache = DiskCache("f", path, max_entries=20, max_bytes=4000)
+    rng = random.Random(0)
+
+    for _ in range(500):
+        key = f"k{rng.randint(0, 40)}"
+        if rng.random() < 0.1:
+            cache.invalidate([f"t{rng.randint(0, 3)}"])
+        else:
+            cache.put(key, "x" * rng.randint(0, 400), tags=(f"t{rng.randint(0, 3)}",))
+        assert (cache.stats.entries, cache.stats.size) == table_stats(cache)
+        assert cache.stats.entries <= 20 and cache.stats.size <= 4000
+
+    assert cache.stats.evictions > 0
+    # A cache opened on the same file starts from the stored entries
+    reopened = DiskCache("f", path, max_entries=20, max_bytes=4000)
+    assert (reopened.stats.entries, reopened.stats.size) == table_stats(cache)
+
+    cache.clear()
+    assert (cache.stats.entries, cache.stats.size) == (0, 0) == table_stats(cache)
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache("f", str(tmp_path / "memo.db"), max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    time.sleep(0.01)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats.entries == 2 and cache.stats.evictions == 1
+
+
+def test_value_computed_across_an_invalidation_is_not_cached():
+    rows = ["old"]
+    calls = []
+
+    @memo.memoize(depends_on=["rows"])
+    def list_rows():
+        calls.append(1)
+        value = list(rows)
+        if len(calls) == 1:
+            # A write and its invalidation land while the listing is computed
+            rows.append("new")
+            memo.invalidate("rows")
+        return value
+
+    try:
+        assert list_rows() == ["old"]
+        assert list_rows() == ["old", "new"]
+        assert list_rows() == ["old", "new"]
+        assert len(calls) == 2
+    finally:
+        list_rows.clear()
+
+
+def test_unrelated_invalidation_keeps_the_value():
+    @memo.memoize(depends_on=["a"])
+    def compute():
+        memo.invalidate("b")
+        return 1
+
+    try:
+        compute()
+        compute()
+        assert compute.stats().hits == 1
+    finally:
+        compute.clear()
@@ -0,0 +1,103 @@
+import os
+import time
+
+import pytest
+
+from apps.sandbox import executor
+from apps.sandbox.executor import ExecutionPool, Limits
+from utils.genai.cancellation import CancellationToken
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="the sandbox requires a POSIX system")
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = ExecutionPool(workers=2, limits=Limits(cpu_time=2, wall_time=5, memory_mb=256))
+    yield pool
+    pool.close()
+
+
+def test_runs_code_and_captures_output(pool):
+    result = pool.run("import sys\nprint('out')\nprint('err', file=sys.stderr)\nraise SystemExit(3)")
+    assert (result.status, result.exit_code) == ("error", 3)
+    assert (result.stdout, result.stderr) == ("out\n", "err\n")
+
+
+def test_server_environment_is_not_inherited(monkeypatch):
+    monkeypatch.setenv("GENAI_API_KEY", "secret")
+    pool = ExecutionPool(workers=1)
+    try:
+        result = pool.run("import os; print(os.environ.get('GENAI_API_KEY')); print(os.environ['HOME'] == os.getcwd())")
+    finally:
+        pool.close()
+    assert result.stdout == "None\nTrue\n"
+
+
+@pytest.mark.parametrize(
+    "code, limits, status",
+    [
+        ("while True: pass", Limits(cpu_time=1, wall_time=10), "cpu_limit"),
+        ("import time; time.sleep(10)", Limits(wall_time=0.5), "timeout"),
+        ("x = bytearray(512 * 1024 * 1024)", Limits(memory_mb=128), "memory_limit"),
+        ("open('f', 'wb').write(b'x' * 4 * 1024 * 1024)", Limits(file_size_mb=1), "file_limit"),
+        ("while True: print('x' * 1000)", Limits(max_output=10000), "output_limit"),
+    ],
+)
+def test_limits(pool, code, limits, status):
+    started = time.monotonic()
+    result = pool.run(code, limits)
+    assert result.status == status
+    assert time.monotonic() - started < 8
+    if status == "output_limit":
+        assert len(result.stdout) == limits.max_output
+
+
+def test_streams_output_while_running(pool):
+    execution = pool.submit("import time\nprint('a', flush=True)\ntime.sleep(0.5)\nprint('b')")
+    first = next(execution.stream())
+    assert first == ("stdout", "a\n")
+    assert not execution.done
+    assert execution.wait(5).stdout == "a\nb\n"
+
+
+def test_cancel_running_and_queued_runs(pool):
+    token = CancellationToken()
+    running = [pool.submit("import time; time.sleep(10)", cancel_token=token) for _ in range(2)]
+    queued = pool.submit("print('never')")
+    time.sleep(0.5)
+    queued.cancel()
+    token.cancel()
+    for execution in running + [queued]:
+        assert execution.wait(5).status == "cancelled"
+    assert queued.result.stdout == ""
+    assert pool.run("print(1)").stdout == "1\n"
+
+
+def test_worker_is_restarted_after_it_dies():
+    pool = ExecutionPool(workers=1)
+    try:
+        assert pool.run("print(1)").status == "ok"
+        execution = pool.submit("import time; time.sleep(10)")
+        time.sleep(0.5)
+        pool._workers[0].process.kill()
+        assert execution.wait(5).status == "crashed"
+        result = pool.run("print(2)")
+        assert (result.status, result.stdout) == ("ok", "2\n")
+        assert pool.status()["started"] == 2
+    finally:
+        pool.close()
+
+
+def test_runs_fail_when_no_worker_starts(monkeypatch):
+    monkeypatch.setattr(executor, "WORKER_PATH", "/nonexistent/worker.py")
+    monkeypatch.setattr(executor, "SPAWN_BACKOFF", 0.01)
+    pool = ExecutionPool(workers=2)
+    try:
+        queued = pool.submit("print(1)")
+        assert queued.wait(5).status == "crashed"
+        assert list(queued.stream()) == []
+        # Later runs fail right away instead of waiting in the queue
+        assert pool.submit("print(1)").wait(0).status == "crashed"
+        assert pool.status()["workers"] == 0
+    finally:
+        pool.close()
@@ -0,0 +1,145 @@
+import math
+import random
+import sqlite3
+from collections import Counter
+
+import pytest
+
+from apps.notes import search
+from apps.notes.search import BM25_B, BM25_K1, InvertedIndex, tokenize
+
+
+def brute_force(docs, query, limit):
+    """Reference BM25 over all documents, without prefix expansion."""
+    tokenized = {doc_id: tokenize(text) for doc_id, text in docs.items()}
+    avg_length = sum(map(len, tokenized.values())) / len(docs) or 1.0
+    df = Counter(term for tokens in tokenized.values() for term in set(tokens))
+
+    scores = {}
+    for doc_id, tokens in tokenized.items():
+        counts = Counter(tokens)
+        score = 0.0
+        for term in dict.fromkeys(tokenize(query)):
+            if counts[term]:
+                idf = math.log(1 + (len(docs) - df[term] + 0.5) / (df[term] + 0.5))
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / avg_length)
+                score += idf * counts[term] * (BM25_K1 + 1) / (counts[term] + norm)
+        if score:
+            scores[doc_id] = score
+    return sorted(scores.items(), key=lambda item: -item[1])[:limit]
+
+
+def build(docs):
+    index = InvertedIndex(sqlite3.connect(":memory:"))
+    for doc_id, text in docs.items():
+        index.add(doc_id, text)
+    return index
+
+
+def assert_same_ranking(actual, expected):
+    assert len(actual) == len(expected)
+    for (_, score), (_, expected_score) in zip(actual, expected):
+        assert score == pytest.approx(expected_score)
+    # Documents tied with the last result may be swapped for each other
+    cutoff = expected[-1][1] if expected else 0.0
+    strictly_above = {doc_id for doc_id, score in expected if score > cutoff + 1e-9}
+    assert strictly_above <= {doc_id for doc_id, _ in actual}
+
+
+def test_common_term_keeps_recall(monkeypatch):
+    monkeypatch.setattr(search, "EARLY_TERMINATION_POSTINGS", 5)
+    docs = {1: "zebra apple"}
+    docs.update({i: "apple pie" for i in range(2, 12)})
+    index = build(docs)
+
+    hits = index.search("zebra apple", limit=10, prefix=False)
+    assert len(hits) == 10
+    assert hits[0][0] == 1
+    assert_same_ranking(hits, brute_force(docs, "zebra apple", 10))
+
+
+@pytest.mark.parametrize("threshold", [0, 20, 5000])
+def test_matches_brute_force(monkeypatch, threshold):
+    monkeypatch.setattr(search, "EARLY_TERMINATION_POSTINGS", threshold)
+    rng = random.Random(threshold)
+    # Zipf-like vocabulary: a few very common words and a long tail
+    vocabulary = [f"w{i}" for i in range(200)]
+    weights = [1 / (i + 1) for i in range(len(vocabulary))]
+    docs = {
+        doc_id: " ".join(rng.choices(vocabulary, weights, k=rng.randint(3, 40)))
+        for doc_id in range(1, 301)
+    }
+    index = build(docs)
+
+    for _ in range(50):
+        query = " ".join(rng.sample(vocabulary[:60], rng.randint(1, 4)))
+        for limit in (1, 5, 20):
+            hits = index.search(query, limit=limit, prefix=False)
+            assert_same_ranking(hits, brute_force(docs, query, limit))
+
+
+def test_prefix_expansion():
+    index = build({1: "performance notes", 2: "perfect pitch", 3: "unrelated"})
+    assert {doc_id for doc_id, _ in index.search("perf")} == {1, 2}
+    assert index.search("perf", prefix=False) == []
+
+
+def test_stale_impacts_keep_exact_ranking(monkeypatch):
+    # Impacts are only recomputed when the average length drifts far, so most
+    # queries run against impacts computed for a different average
+    monkeypatch.setattr(search, "EARLY_TERMINATION_POSTINGS", 0)
+    rng = random.Random(7)
+    vocabulary = [f"w{i}" for i in range(50)]
+    index = InvertedIndex(sqlite3.connect(":memory:"))
+    docs = {}
+    for doc_id in range(1, 401):
+        # Documents get longer over time, then the short ones are replaced
+        docs[doc_id] = " ".join(rng.choices(vocabulary, k=rng.randint(2, 5 + doc_id // 4)))
+        index.add(doc_id, docs[doc_id])
+    for doc_id in range(1, 100, 3):
+        docs[doc_id] = " ".join(rng.choices(vocabulary, k=rng.randint(100, 150)))
+        index.add(doc_id, docs[doc_id])
+    for doc_id in range(2, 100, 3):
+        del docs[doc_id]
+        index.remove(doc_id)
+
+    for _ in range(30):
+        query = " ".join(rng.sample(vocabulary[:20], rng.randint(1, 3)))
+        hits = index.search(query, limit=5, prefix=False)
+        assert_same_ranking(hits, brute_force(docs, query, 5))
+
+
+def test_index_without_impacts_is_migrated(monkeypatch):
+    monkeypatch.setattr(search, "EARLY_TERMINATION_POSTINGS", 0)
+    docs = {1: "zebra apple", 2: "apple pie", 3: "apple apple crumble pie"}
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(
+        """
+        CREATE TABLE index_stats (id INTEGER PRIMARY KEY CHECK (id = 0),
+            doc_count INTEGER NOT NULL, total_length INTEGER NOT NULL);
+        CREATE TABLE index_docs (doc_id INTEGER PRIMARY KEY, length INTEGER NOT NULL);
+        CREATE TABLE index_terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID;
+        CREATE TABLE index_postings (term TEXT NOT NULL, doc_id INTEGER NOT NULL,
+            tf INTEGER NOT NULL, PRIMARY KEY (term, doc_id)) WITHOUT ROWID;
+        """
+    )
+    tokenized = {doc_id: tokenize(text) for doc_id, text in docs.items()}
+    conn.execute(
+        "INSERT INTO index_stats VALUES (0, ?, ?)",
+        (len(docs), sum(map(len, tokenized.values()))),
+    )
+    for doc_id, tokens in tokenized.items():
+        conn.execute("INSERT INTO index_docs VALUES (?, ?)", (doc_id, len(tokens)))
+        for term, tf in Counter(tokens).items():
+            conn.execute("INSERT INTO index_postings VALUES (?, ?, ?)", (term, doc_id, tf))
+            conn.execute(
+                "INSERT INTO index_terms VALUES (?, 1) ON CONFLICT (term) DO UPDATE SET df = df + 1",
+                (term,),
+            )
+    conn.commit()
+
+    index = InvertedIndex(conn)
+    for query in ("apple", "apple pie", "zebra crumble"):
+        assert_same_ranking(
+            index.search(query, limit=2, prefix=False), brute_force(docs, query, 2)
+        )
@@ -0,0 +1,135 @@
+import json
+import random
+import time
+
+import pytest
+
+from utils.genai.genai_service import GenAIService
+from utils.genai.structured import IncrementalJSONParser, validate
+
+DOCUMENT = {
+    "title": "Quarterly \"review\" \\ notes",
+    "score": -12.5e-3,
+    "ok": True,
+    "missing": None,
+    "tags": ["alpha", "beta, gamma", "{not] json}"],
+    "items": [{"name": "a", "values": [1, 2, {"deep": [3]}]}, [], {}],
+    "nested": {"inner": {"x": [1, [2, [3]]]}, "empty": ""},
+    "unicode": "café ☃ \\u00e9",
+}
+
+
+def expected_events(value, max_depth, path=()):
+    # Values in completion order: children before their parent
+    events = []
+    if isinstance(value, dict):
+        children = value.items()
+    elif isinstance(value, list):
+        children = enumerate(value)
+    else:
+        children = []
+    for slot, child in children:
+        events.extend(expected_events(child, max_depth, path + (slot,)))
+        if len(path) < max_depth:
+            events.append((path + (slot,), child))
+    return events
+
+
+def random_chunks(rng, text):
+    chunks, start = [], 0
+    while start < len(text):
+        end = start + rng.randint(1, 12)
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+@pytest.mark.parametrize("max_depth", [0, 1, 2, 3, 5])
+def test_parser_matches_json_for_any_chunking(max_depth):
+    rng = random.Random(max_depth)
+    text = "```json\n" + json.dumps(DOCUMENT, indent=rng.choice([None, 2])) + "\n```"
+    for _ in range(50):
+        parser = IncrementalJSONParser(max_depth)
+        events = []
+        for chunk in random_chunks(rng, text):
+            events.extend(parser.feed(chunk))
+        assert parser.close() == DOCUMENT
+        assert events == expected_events(DOCUMENT, max_depth)
+
+
+def test_parser_reports_fields_before_the_document_ends():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"a": 1, "b": ["x", ') == [(("a",), 1), (("b", 0), "x")]
+    assert parser.feed('"y"], "c"') == [(("b", 1), "y"), (("b",), ["x", "y"])]
+    with pytest.raises(ValueError):
+        parser.close()
+    assert parser.feed(': {"d": [1]}}') == [(("c", "d"), [1]), (("c",), {"d": [1]})]
+    assert parser.close() == {"a": 1, "b": ["x", "y"], "c": {"d": [1]}}
+
+
+def test_parser_is_linear_in_document_size():
+    def parse_time(count):
+        document = json.dumps({"items": [{"id": i, "text": "x" * 50} for i in range(count)]})
+        parser = IncrementalJSONParser()
+        started = time.perf_counter()
+        for start in range(0, len(document), 4):
+            parser.feed(document[start : start + 4])
+        assert len(parser.close()["items"]) == count
+        return time.perf_counter() - started
+
+    small, large = parse_time(2000), parse_time(16000)
+    # Quadratic behaviour would make this about 64 times slower
+    assert large < small * 20
+
+
+class FakeClient:
+    """Streams canned responses, one per request, in small chunks."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.prompts = []
+
+    def stream_chat(self, messages, model=None, temperature=0, response_format=None, timeout=None):
+        self.prompts.append(messages[-1]["content"])
+        text = self.responses.pop(0)
+        for start in range(0, len(text), 3):
+            yield text[start : start + 3]
+
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "tags": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["title", "tags"],
+}
+
+
+def test_structured_retries_the_document():
+    client = FakeClient(['{"tags": []}', '{"title": "T", "tags": ["a"]}'])
+    result = GenAIService(client).process_structured("Note", SCHEMA)
+    assert not result.failure()
+    assert result.value == {"title": "T", "tags": ["a"]}
+    assert result.requests == 2
+    assert "title" in client.prompts[1]
+
+
+def test_structured_repairs_only_invalid_items():
+    client = FakeClient(['{"title": "T", "tags": ["a", 2, "c"]}', '{"item": "b"}'])
+    fields = []
+    result = GenAIService(client).process_structured(
+        "Note", SCHEMA, on_field=lambda path, value: fields.append(path)
+    )
+    assert result.value == {"title": "T", "tags": ["a", "b", "c"]}
+    assert result.requests == 2
+    assert validate(result.value, SCHEMA) == []
+    assert ("tags", 1) in fields and ("title",) in fields
+
+
+def test_structured_gives_up_after_max_retries():
+    client = FakeClient(['{"title": 1, "tags": []}'] * 3)
+    result = GenAIService(client).process_structured("Note", SCHEMA, max_retries=2)
+    assert result.failure()
+    assert result.requests == 3
+    assert client.responses == []